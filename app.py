@@ -1,22 +1,25 @@
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context, g
+import gc
+import time
 import os
 import json
-import nltk
+import threading
 
-# -------------------------
-# NLTK punkt setup
-# -------------------------
-NLTK_DATA_DIR = r'D:\nltk_data'  # change to any local folder you prefer
-nltk.data.path.append(NLTK_DATA_DIR)
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt', download_dir=NLTK_DATA_DIR)
-
-from services.search_service import SearchService
+from services.search_service import SearchService, SEARCH_FIELDS, SEARCH_MODES
+from services.semantic_index import SemanticIndex
+from services.knowledge_graph import KnowledgeGraph, ANALYSIS_PREFIX
+from services.related_index import RelatedIndex
+from services.catalog import load_catalog
 from services.pdf_processor import PDFProcessor
 from services.uploadpdf import UploadPDFService
+from services.fulltext_index import FullTextIndex
+from services.cache_store import CacheStore
+from services.model_registry import registry, current_rss_bytes, memory_breakdown
+from services.ai_analyzer import AIAnalyzer
+from services.batch_scheduler import MicroBatcher, inference_slots
+from services.job_manager import JobManager, JobQueueFull
+from services.metrics import metrics, HTTP_SECONDS, RequestProfiler
+from config import Config
 
 app = Flask(
     __name__,
@@ -25,27 +28,172 @@ app = Flask(
 )
 
 # Initialize services
-search_service = SearchService()
-pdf_processor = PDFProcessor()
-upload_service = UploadPDFService()
+fulltext_index = FullTextIndex(os.path.join('data', 'cache', 'fulltext'))
+semantic_index = SemanticIndex(Config.SEMANTIC_DIR, dim=Config.SEMANTIC_DIM,
+                               min_similarity=Config.SEMANTIC_MIN_SIMILARITY)
+search_service = SearchService(fulltext_index=fulltext_index, semantic_index=semantic_index)
+cache_store = CacheStore.from_config()
+
+# Summarizers share one micro-batching scheduler when enabled
+inference_slots.configure(Config.INFERENCE_SLOTS)  # concurrent summarizer calls per process
+scheduler = MicroBatcher(Config.MICRO_BATCH_MAX_SIZE, Config.MICRO_BATCH_WAIT_MS) if Config.MICRO_BATCHING else None
+inference = dict(backend=Config.INFERENCE_BACKEND, intra_op_threads=Config.TORCH_INTRA_OP_THREADS,
+                 inter_op_threads=Config.TORCH_INTER_OP_THREADS)
+catalog_analyzer = AIAnalyzer("t5-small", batch_size=Config.SUMMARY_BATCH_SIZE, scheduler=scheduler, cache=cache_store,
+                              **inference)
+upload_analyzer = AIAnalyzer(batch_size=Config.SUMMARY_BATCH_SIZE, scheduler=scheduler, cache=cache_store, **inference)
+
+pdf_processor = PDFProcessor(fulltext_index=fulltext_index, ai_analyzer=catalog_analyzer, cache_store=cache_store)
+knowledge_graph = KnowledgeGraph(Config.GRAPH_DIR)
+related_index = RelatedIndex(Config.RELATED_DIR)
+cache_store.subscribe(ANALYSIS_PREFIX, knowledge_graph.on_analysis)  # new analyses extend the graph in place
+cache_store.subscribe(ANALYSIS_PREFIX, related_index.on_analysis)    # ... and the MinHash signatures
+upload_service = UploadPDFService(pdf_processor=pdf_processor, ai_analyzer=upload_analyzer)
+job_manager = JobManager(max_workers=Config.ANALYSIS_WORKERS, max_pending=Config.MAX_PENDING_JOBS)
 
 # Load publications data
-publications_df = None
+catalog = None
+
+# Scrape-time gauges for state the services already track
+metrics.gauge_callback("jobs", "Analysis jobs by status", ("status",),
+                       lambda: {(status,): n for status, n in job_manager.stats().items()})
+metrics.gauge_callback("catalog_publications", "Publications in the loaded catalog", (),
+                       lambda: {(): len(catalog) if catalog is not None else 0})
+metrics.gauge_callback("models_loaded", "Models held by the registry", (),
+                       lambda: {(): sum(registry.is_loaded(name) for name in registry.stats()["models"])})
+metrics.gauge_callback("process_rss_bytes", "Resident set size of this process", (),
+                       lambda: {(): current_rss_bytes()})
+metrics.gauge_callback("process_memory_bytes", "This worker's memory from smaps_rollup (pss = its share of shared pages)",
+                       ("pid", "kind"),
+                       lambda: {(os.getpid(), kind): value for kind, value in memory_breakdown().items()})
+metrics.gauge_callback("inference_slots", "Summarizer slots of this worker", ("state",),
+                       lambda: {(state,): n for state, n in inference_slots.snapshot().items()})
+profiler = RequestProfiler(Config.PROFILE_DIR, sample_rate=Config.PROFILE_SAMPLE_RATE)
+
+# Analyses cached by other processes (serve.py workers, precompute.py) reach this
+# process's graph and related index through the shared cache, not through its listeners
+analysis_sync = {"since": 0.0, "checked": 0.0}
+analysis_sync_lock = threading.Lock()
+ANALYSIS_SYNC_OVERLAP = 5.0  # seconds re-read each time: concurrent writers commit slightly out of order
 
 def load_data():
-    """Load publications from CSV file"""
-    global publications_df
+    """Load the publication catalog (memory-mapped snapshot, rebuilt from the CSV when stale)"""
+    global catalog
     import traceback
     try:
-        data_path = os.path.join('data', 'SB_publication_PMC.csv')
-        publications_df = pd.read_csv(data_path)
-        print(f"Loaded {len(publications_df)} publications")
+        catalog = load_catalog(Config.CSV_FILE, Config.CATALOG_FILE)
+        search_service.build_index(catalog)
+        analysis_sync["since"] = analysis_sync["checked"] = time.time()
+        bodies = pdf_processor.cached_bodies()
+        search_service.build_semantic(catalog, bodies)
+        knowledge_graph.load_or_build(catalog.titles, bodies)
+        related_index.load_or_build(catalog.titles, bodies)
+        print(f"Loaded {len(catalog)} publications")
         return True
     except Exception as e:
         print(f"Error loading data: {e}")
         traceback.print_exc()
         return False
 
+def sync_analyses(force=False):
+    """Apply analyses cached since the last sync, by any process, to the graph and related index"""
+    now = time.time()
+    if not force and now - analysis_sync["checked"] < Config.ANALYSIS_SYNC_SECONDS:
+        return
+    if not analysis_sync_lock.acquire(blocking=False):
+        return  # another thread is syncing
+    try:
+        analysis_sync["checked"] = now
+        since = analysis_sync["since"]
+        analysis_sync["since"] = max(since, cache_store.replay(ANALYSIS_PREFIX, since - ANALYSIS_SYNC_OVERLAP))
+    finally:
+        analysis_sync_lock.release()
+
+def start_analysis_sync():
+    """Run sync_analyses every ANALYSIS_SYNC_SECONDS on a daemon thread, off the request path"""
+    def loop():
+        while True:
+            time.sleep(Config.ANALYSIS_SYNC_SECONDS)
+            try:
+                sync_analyses(force=True)
+            except Exception as e:
+                print(f"[WARN] Analysis sync failed: {e}")
+
+    thread = threading.Thread(target=loop, name="analysis-sync", daemon=True)
+    thread.start()
+    return thread
+
+def persist_indexes():
+    """Write pending graph and related-index updates (by the process that owns the snapshots)"""
+    knowledge_graph.flush()
+    related_index.flush()
+
+# -------------------------
+# Instrumentation
+# -------------------------
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    requested = Config.PROFILE_REQUESTS and (request.args.get('profile') == '1' or 'X-Profile' in request.headers)
+    g.profile = profiler.start(requested)
+
+@app.after_request
+def record_request(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        path = profiler.stop(profile, request.endpoint or 'unknown')
+        response.headers['X-Profile-File'] = str(path)
+    if 'request_start' in g:
+        HTTP_SECONDS.observe(time.perf_counter() - g.pop('request_start'), endpoint=request.endpoint or 'unknown',
+                             method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    """Always runs: stop what after_request did not (it is skipped on unhandled exceptions in debug)"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile, request.endpoint or 'unknown')
+    if 'request_start' in g:
+        HTTP_SECONDS.observe(time.perf_counter() - g.pop('request_start'), endpoint=request.endpoint or 'unknown',
+                             method=request.method, status=500)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# -------------------------
+# Server-Sent Events
+# -------------------------
+def job_events(job, heartbeat=15):
+    """Replay and follow a job's events; None marks an idle interval (sent as a keep-alive)"""
+    since = 0
+    while True:
+        events, since = job.wait_events(since, timeout=heartbeat)
+        yield from events
+        if job.done and since >= job.event_count:
+            if job.status == "failed":
+                yield {"event": "error", "error": job.error}
+            return
+        if not events:
+            yield None
+
+def sse_response(events):
+    """Stream event dicts as text/event-stream, one SSE message per event, then 'end'"""
+    def generate():
+        try:
+            for event in events:
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'event': 'error', 'error': str(e)})}\n\n"
+        yield "event: end\ndata: {}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # -------------------------
 # Routes
 # -------------------------
@@ -58,6 +206,9 @@ def search():
     query = request.args.get('q', '').strip()
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
+    field = request.args.get('field', 'title')
+    if field not in SEARCH_FIELDS:
+        field = 'title'
     
     if not query:
         return render_template(
@@ -66,10 +217,11 @@ def search():
             query="", 
             total=0, 
             page=1, 
-            total_pages=0
+            total_pages=0,
+            field=field
         )
     
-    results = search_service.search(publications_df, query, page, per_page)
+    results = search_service.search(catalog, query, page, per_page, field=field)
     
     return render_template(
         'search_results.html',
@@ -77,54 +229,193 @@ def search():
         query=query,
         total=results['total'],
         page=page,
-        total_pages=results['total_pages']
+        total_pages=results['total_pages'],
+        field=field
     )
 
+def related_publications(pub_id, limit):
+    """Catalog records of the publications most similar to pub_id, skipping duplicate catalog rows"""
+    seen = {catalog.link(pub_id)}
+    related = []
+    for pos, similarity in related_index.related(pub_id, limit * 2):
+        record = catalog.record(pos)
+        if record['Link'] in seen:
+            continue
+        seen.add(record['Link'])
+        record['index'] = pos
+        record['similarity'] = similarity
+        related.append(record)
+    return related[:limit]
+
 @app.route('/publication/<int:pub_id>')
 def publication_detail(pub_id):
-    if publications_df is None or pub_id >= len(publications_df):
+    if catalog is None or pub_id >= len(catalog):
         return "Publication not found", 404
     
-    pub = publications_df.iloc[pub_id]
-    cache_file = f"data/cache/pub_{pub_id}_analysis.json"
-    analysis_data = None
-    
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            analysis_data = json.load(f)
+    pub = catalog.record(pub_id)
+    analysis_data = pdf_processor.get_cached(pub_id)  # hot tier, then SQLite
     
     return render_template(
         'publication.html',
         publication=pub,
         pub_id=pub_id,
-        analysis=analysis_data
+        analysis=analysis_data,
+        kg_terms=knowledge_graph.terms_for(pub['Title']),
+        related=related_publications(pub_id, Config.RELATED_PAPERS)
     )
 
-@app.route('/api/analyze/<int:pub_id>')
+@app.route('/pmc/<pmcid>')
+def publication_by_pmcid(pmcid):
+    pub_id = catalog.row_for_pmcid(pmcid) if catalog is not None else None
+    if pub_id is None:
+        return "Publication not found", 404
+    return redirect(url_for('publication_detail', pub_id=pub_id))
+
+@app.route('/api/analyze/<int:pub_id>', methods=['GET', 'POST'])
 def analyze_publication(pub_id):
-    if publications_df is None or pub_id >= len(publications_df):
+    """Return the cached analysis, or start (or join) a background job and return its id"""
+    if catalog is None or pub_id >= len(catalog):
         return jsonify({"error": "Publication not found"}), 404
     
-    pub = publications_df.iloc[pub_id]
+    cached = pdf_processor.get_cached(pub_id)
+    if cached is not None:
+        return jsonify(cached)
+    
+    pub = catalog.record(pub_id)
     
     try:
-        result = pdf_processor.process_publication(pub, pub_id)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        job, created = job_manager.submit(f"pub:{pub_id}", pdf_processor.process_publication_stream, pub, pub_id)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    
+    response = job.to_dict()
+    response["poll_url"] = f"/api/jobs/{job.id}"
+    response["attached"] = not created
+    return jsonify(response), 202
+
+@app.route('/api/analyze/<int:pub_id>/stream')
+def analyze_publication_stream(pub_id):
+    """Server-Sent Events: progress, each chunk summary, knowledge gaps, then the result"""
+    if catalog is None or pub_id >= len(catalog):
+        return jsonify({"error": "Publication not found"}), 404
+    
+    cached = pdf_processor.get_cached(pub_id)
+    if cached is not None:
+        return sse_response([{"event": "result", "result": cached}])
+    
+    # Same job as /api/analyze, so a stream and a poller share one analysis
+    try:
+        job, _ = job_manager.submit(f"pub:{pub_id}", pdf_processor.process_publication_stream,
+                                    catalog.record(pub_id), pub_id)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return sse_response(job_events(job))
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
 
 @app.route('/api/search')
 def api_search():
     query = request.args.get('q', '').strip()
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
+    field = request.args.get('field', 'title')
+    mode = request.args.get('mode', 'lexical')
+    
+    if field not in SEARCH_FIELDS:
+        return jsonify({"error": f"field must be one of {', '.join(SEARCH_FIELDS)}"}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
     
     if not query:
         return jsonify({"publications": [], "total": 0, "total_pages": 0})
     
-    results = search_service.search(publications_df, query, page, per_page)
+    results = search_service.search(catalog, query, page, per_page, field=field, mode=mode)
     return jsonify(results)
 
+@app.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    """
+    Body: {"queries": [...], "k": 5, "field": "title", "mode": "lexical"} or a
+    bare list of queries. Streams one NDJSON line per query, in order.
+    """
+    body = request.get_json(silent=True)
+    options = body if isinstance(body, dict) else {}
+    queries = options.get('queries') if isinstance(body, dict) else body
+    field = options.get('field', 'title')
+    mode = options.get('mode', 'lexical')
+    
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return jsonify({"error": "queries must be a list of strings"}), 400
+    if len(queries) > Config.SEARCH_BATCH_MAX_QUERIES:
+        return jsonify({"error": f"at most {Config.SEARCH_BATCH_MAX_QUERIES} queries per batch"}), 413
+    if field not in SEARCH_FIELDS:
+        return jsonify({"error": f"field must be one of {', '.join(SEARCH_FIELDS)}"}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    try:
+        k = min(max(int(options.get('k', 5)), 1), Config.SEARCH_BATCH_MAX_K)
+    except (TypeError, ValueError):
+        return jsonify({"error": "k must be an integer"}), 400
+    
+    def generate():
+        for i, result in enumerate(search_service.search_batch(catalog, queries, k, field=field, mode=mode)):
+            yield json.dumps({"i": i, **result}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/search/stats')
+def api_search_stats():
+    return jsonify({"result_cache": search_service.cache_stats(), "semantic": semantic_index.stats()})
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    return jsonify(cache_store.stats())
+
+@app.route('/api/suggest')
+def api_suggest():
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 6)), 1), 10)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    suggestions = search_service.get_suggestions(catalog, query, limit)
+    return jsonify({"query": query, "suggestions": suggestions})
+
+@app.route('/api/related/<int:pub_id>')
+def api_related(pub_id):
+    if catalog is None or pub_id >= len(catalog):
+        return jsonify({"error": "Publication not found"}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', Config.RELATED_PAPERS)), 1), 20)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({"pub_id": pub_id, "related": related_publications(pub_id, limit)})
+
+@app.route('/api/graph')
+def api_graph():
+    """Neighbourhood of a term in the co-occurrence graph: nodes plus PMI-weighted edges"""
+    term = request.args.get('term', '').strip()
+    depth = int(request.args.get('depth', 1))
+    limit = int(request.args.get('limit', 10))
+    
+    if not term:
+        return jsonify({"error": "term is required"}), 400
+    
+    graph = knowledge_graph.subgraph(term, depth, limit)
+    if graph is None:
+        return jsonify({"error": f"Unknown term: {term}"}), 404
+    return jsonify(graph)
+
+@app.route('/api/graph/stats')
+def api_graph_stats():
+    return jsonify(knowledge_graph.stats())
+
 @app.route('/api/upload_pdf', methods=['POST'])
 def upload_pdf():
     """Handle PDF upload and AI analysis"""
@@ -140,10 +431,40 @@ def upload_pdf():
         result = upload_service.handle_upload(pdf_file)
         return jsonify(result)
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 
+@app.route('/api/upload_pdf/stream', methods=['POST'])
+def upload_pdf_stream():
+    """Upload a PDF and stream its analysis as Server-Sent Events"""
+    pdf_file = request.files.get('file') or request.files.get('pdf_file')
+    if pdf_file is None or pdf_file.filename == "":
+        return jsonify({"error": "No file uploaded"}), 400
+    try:
+        save_path, sha256 = upload_service.save_upload(pdf_file)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return sse_response(upload_service.analyze_stream(save_path, sha256, pdf_file.filename))
+
+@app.route('/api/models')
+def api_models():
+    stats = registry.stats()
+    stats["summarizers"] = [catalog_analyzer.stats(), upload_analyzer.stats()]
+    return jsonify(stats)
+
+@app.route('/api/worker')
+def api_worker():
+    """The serving process that answered: pid, memory (RSS/PSS/shared) and inference slots"""
+    return jsonify({
+        "pid": os.getpid(),
+        "memory": memory_breakdown(),
+        "inference": inference_slots.snapshot(),
+        "gc_frozen_objects": gc.get_freeze_count(),
+    })
+
 @app.route("/about")
 def about():
     return render_template("about.html")
@@ -154,6 +475,13 @@ def about():
 # -------------------------
 if __name__ == '__main__':
     if load_data():
+        # Search is served right away; summarizers load in the background
+        # (only in the serving process, not the debug reloader's watcher)
+        serving = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+        if serving and os.environ.get('MODEL_WARMUP', 'true').lower() == 'true':
+            registry.warm_up()
+        if serving:
+            start_analysis_sync()
         print("Starting Flask app on http://127.0.0.1:5000")
         app.run(debug=True, port=5000)
     else:
@@ -0,0 +1,436 @@
+"""
+Offline benchmark suite for NASA Bioscience Explorer.
+
+Measures, without network access:
+  search     SearchService.search latency (p50/p95/p99) on synthetic catalogs
+             scaled from the publication CSV (1x = the real catalog)
+  suggest    SearchService.get_suggestions latency per keystroke
+  extract    PDF extraction pages/sec over the fixture PDFs in data/uploads
+  summarize  summarizer chunks/sec with the stub model and, when transformers
+             is installed, t5-small
+  inference  the summarizer's CPU inference backends (fp32, dynamic int8) on the
+             fixture PDFs: per-batch latency, chunks/sec, RSS, and ROUGE drift of
+             each backend's summaries against fp32 (needs torch and transformers)
+
+Results are written as JSON. Pass --compare to diff them against a stored
+baseline: latencies that grew, or throughputs that fell, by more than
+--threshold are reported as regressions.
+
+Examples:
+  python benchmark.py                                   # all suites, 1x/10x/100x
+  python benchmark.py --suites search --scales 1 10 100 1000
+  python benchmark.py --save-baseline benchmarks/baseline.json   # results also go to benchmarks/latest.json
+  python benchmark.py --compare benchmarks/baseline.json --fail-on-regression
+  python benchmark.py --suites inference --backends fp32 int8 --intra-op-threads 4 --inter-op-threads 1
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from config import Config
+from services.ai_analyzer import AIAnalyzer, BACKENDS, configure_torch_threads, pipeline_name, sent_tokenize
+from services.catalog import Catalog
+from services.model_registry import registry, current_rss_bytes
+from services.pdf_processor import extract_pdf_pages, extract_pdf_text
+from services.search_service import SearchService
+
+SUITES = ("search", "suggest", "extract", "summarize", "inference")
+
+
+# -------------------------------
+# Helpers
+# -------------------------------
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 4)
+
+    return {
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered), 4),
+        "samples": len(ordered),
+    }
+
+
+def timed_ms(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def synthetic_catalog(titles, links, scale, seed=0):
+    """
+    The real catalog plus scale-1 perturbed copies: each copy swaps a couple
+    of words for random vocabulary words, so postings grow with the scale
+    without every copy being an exact duplicate.
+    """
+    rng = random.Random(seed)
+    vocabulary = sorted({word for title in titles for word in title.split()})
+    out_titles, out_links = list(titles), list(links)
+    for replica in range(1, scale):
+        for title, link in zip(titles, links):
+            words = title.split()
+            for _ in range(min(2, len(words))):
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            out_titles.append(" ".join(words))
+            out_links.append(f"{link}#r{replica}")
+    return Catalog.from_records(out_titles, out_links)
+
+
+def sample_queries(titles, n, seed=1):
+    """One- and two-word queries drawn from the titles (searches that have hits)"""
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < n:
+        words = [w for w in rng.choice(titles).split() if len(w) > 3]
+        if not words:
+            continue
+        start = rng.randrange(len(words))
+        queries.append(" ".join(words[start:start + rng.choice((1, 2))]))
+    return queries
+
+
+def _ngrams(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def _f1(overlap, ref_total, cand_total):
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / cand_total, overlap / ref_total
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge(reference, candidate):
+    """ROUGE-1/2/L F1 of candidate against reference (lowercased word tokens)"""
+    ref, cand = re.findall(r"\w+", (reference or "").lower()), re.findall(r"\w+", (candidate or "").lower())
+    scores = {}
+    for n in (1, 2):
+        ref_grams, cand_grams = _ngrams(ref, n), _ngrams(cand, n)
+        overlap = sum((ref_grams & cand_grams).values())
+        scores[f"rouge{n}"] = _f1(overlap, sum(ref_grams.values()), sum(cand_grams.values()))
+    # Longest common subsequence, one row at a time
+    previous = [0] * (len(cand) + 1)
+    for word in ref:
+        current = [0]
+        for j, other in enumerate(cand):
+            current.append(previous[j] + 1 if word == other else max(previous[j + 1], current[j]))
+        previous = current
+    scores["rougeL"] = _f1(previous[-1], len(ref), len(cand))
+    return scores
+
+
+# -------------------------------
+# Suites
+# -------------------------------
+def bench_search(args, titles, links):
+    results = {}
+    queries = sample_queries(titles, args.queries)
+    for scale in args.scales:
+        catalog = synthetic_catalog(titles, links, scale)
+        service = SearchService()
+        gc.collect()
+        build_ms = timed_ms(service.build_index, catalog)
+
+        # Cold: every query misses the result cache
+        cold = []
+        for query in queries:
+            service.result_cache.clear()
+            cold.append(timed_ms(service.search, catalog, query, 1, 10))
+        # Warm: the same queries again, served from the result cache
+        warm = [timed_ms(service.search, catalog, query, 1, 10) for query in queries]
+        # Deep pages re-rank beyond the cached depth
+        deep = []
+        for query in queries[:max(len(queries) // 4, 1)]:
+            service.result_cache.clear()
+            deep.append(timed_ms(service.search, catalog, query, 20, 10))
+        # Batch: every query in one search_batch() pass (it bypasses the result cache);
+        # the flat postings arrays are built once, on the first batch
+        arrays_ms = timed_ms(service.index.arrays)
+        batch_ms = timed_ms(lambda: list(service.search_batch(catalog, queries, 10)))
+
+        results[f"{scale}x"] = {
+            "publications": len(catalog),
+            "build_index_ms": round(build_ms, 2),
+            "cold": percentiles(cold),
+            "warm": percentiles(warm),
+            "page_20": percentiles(deep),
+            "batch_arrays_ms": round(arrays_ms, 2),
+            "batch_queries_per_sec": round(len(queries) / (batch_ms / 1000), 1),
+        }
+        print(f"search {scale}x ({len(catalog)} docs): cold p50 {results[f'{scale}x']['cold']['p50_ms']} ms, "
+              f"p99 {results[f'{scale}x']['cold']['p99_ms']} ms, "
+              f"batch {results[f'{scale}x']['batch_queries_per_sec']} queries/s", flush=True)
+    return results
+
+
+def bench_suggest(args, titles, links):
+    catalog = Catalog.from_records(titles, links)
+    service = SearchService()
+    service.build_index(catalog)
+    samples = []
+    for query in sample_queries(titles, args.queries, seed=2):
+        for end in range(1, len(query) + 1):  # every keystroke
+            samples.append(timed_ms(service.get_suggestions, catalog, query[:end], 6))
+    result = percentiles(samples)
+    print(f"suggest: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms", flush=True)
+    return result
+
+
+def bench_extract(args, titles, links):
+    pdfs = sorted(Path(args.pdf_dir).glob("*.pdf"))
+    if not pdfs:
+        return {"skipped": f"no PDFs in {args.pdf_dir}"}
+    results = {"files": len(pdfs)}
+    for workers in sorted({1, Config.EXTRACT_WORKERS}):
+        pages, seconds = 0, 0.0
+        for _ in range(args.repeat):
+            for pdf in pdfs:
+                start = time.perf_counter()
+                pages += len(extract_pdf_pages(pdf, workers=workers))
+                seconds += time.perf_counter() - start
+        results[f"workers_{workers}"] = {
+            "pages": pages,
+            "seconds": round(seconds, 3),
+            "pages_per_sec": round(pages / seconds, 2) if seconds else 0.0,
+        }
+        print(f"extract (workers={workers}): {results[f'workers_{workers}']['pages_per_sec']} pages/sec", flush=True)
+    return results
+
+
+def bench_summarize(args, titles, links):
+    from precompute import StubSummarizer
+    registry.register("summarizer:stub", StubSummarizer)
+
+    pdfs = sorted(Path(args.pdf_dir).glob("*.pdf"))
+    text = "\n".join(extract_pdf_text(pdf) for pdf in pdfs) if pdfs else " ".join(titles)
+
+    results = {}
+    for model in args.models:
+        if model != "stub":
+            try:
+                import transformers  # noqa: F401
+            except ImportError:
+                results[model] = {"skipped": "transformers is not installed"}
+                print(f"summarize {model}: skipped (transformers is not installed)")
+                continue
+
+        analyzer = AIAnalyzer(model, batch_size=args.batch_size)
+        chunks = analyzer._chunk_text(text)[:args.max_chunks]
+        inputs = [analyzer.INSTRUCTIONS + "\n" + chunk for chunk in chunks]
+        analyzer._generate(inputs[:1], max_length=60, min_length=10)  # load weights / warm up
+
+        start = time.perf_counter()
+        analyzer._generate(inputs, max_length=args.max_len, min_length=min(args.max_len, 30))
+        seconds = time.perf_counter() - start
+        results[model] = {
+            "chunks": len(inputs),
+            "batch_size": args.batch_size,
+            "seconds": round(seconds, 3),
+            "chunks_per_sec": round(len(inputs) / seconds, 2) if seconds else 0.0,
+            "sentences": len(sent_tokenize(text)),
+        }
+        print(f"summarize {model}: {results[model]['chunks_per_sec']} chunks/sec", flush=True)
+    return results
+
+
+def bench_inference(args, titles, links):
+    """
+    fp32 first, as the reference, then each other backend on the same chunks.
+    The recommendation is the fastest backend whose mean ROUGE-L against
+    fp32 stays at or above --min-rouge.
+    """
+    try:
+        import torch  # noqa: F401
+        import transformers  # noqa: F401
+    except ImportError:
+        print("inference: skipped (torch and transformers are required)")
+        return {"skipped": "torch and transformers are required"}
+    pdfs = sorted(Path(args.pdf_dir).glob("*.pdf"))
+    if not pdfs:
+        return {"skipped": f"no PDFs in {args.pdf_dir}"}
+
+    configure_torch_threads(args.intra_op_threads, args.inter_op_threads)
+    text = "\n".join(extract_pdf_text(pdf) for pdf in pdfs)
+    backends = ["fp32"] + [b for b in args.backends if b != "fp32"]
+    results = {"threads": {"intra_op": torch.get_num_threads(), "inter_op": torch.get_num_interop_threads()}}
+
+    for model in args.inference_models:
+        results[model], reference = {}, None
+        for backend in backends:
+            analyzer = AIAnalyzer(model, batch_size=args.batch_size, backend=backend)
+            rss_before = current_rss_bytes()
+            analyzer.summarizer  # load (and quantize) outside the timed region
+            load = registry.stats()["models"].get(pipeline_name(model, backend), {})
+
+            chunks = analyzer._chunk_text(text)[:args.max_chunks]
+            inputs = [analyzer.INSTRUCTIONS + "\n" + chunk for chunk in chunks]
+            gen_kwargs = {"max_length": args.max_len, "min_length": min(args.max_len, 30)}
+            analyzer._generate(inputs[:1], **gen_kwargs)  # warm up
+
+            outputs, latencies = [], []
+            start = time.perf_counter()
+            for i in range(0, len(inputs), args.batch_size):
+                batch_start = time.perf_counter()
+                outputs.extend(analyzer._generate(inputs[i:i + args.batch_size], **gen_kwargs))
+                latencies.append((time.perf_counter() - batch_start) * 1000)
+            seconds = time.perf_counter() - start
+
+            entry = {
+                "chunks": len(inputs),
+                "batch_latency": percentiles(latencies),
+                "chunks_per_sec": round(len(inputs) / seconds, 2) if seconds else 0.0,
+                "load_seconds": load.get("load_seconds"),
+                "rss_delta_mb": round(max(current_rss_bytes() - rss_before, 0) / (1024 * 1024), 1),
+                "rss_mb": round(current_rss_bytes() / (1024 * 1024), 1),
+            }
+            if reference is None:
+                reference = outputs
+            else:
+                pairs = [rouge(ref, out) for ref, out in zip(reference, outputs)]
+                entry["rouge_vs_fp32"] = {name: round(sum(p[name] for p in pairs) / len(pairs), 4)
+                                          for name in ("rouge1", "rouge2", "rougeL")} if pairs else {}
+            results[model][backend] = entry
+            print(f"inference {model} {backend}: {entry['chunks_per_sec']} chunks/sec, "
+                  f"p50 {entry['batch_latency'].get('p50_ms')} ms/batch, +{entry['rss_delta_mb']} MB"
+                  + (f", ROUGE-L vs fp32 {entry['rouge_vs_fp32'].get('rougeL')}" if "rouge_vs_fp32" in entry else ""),
+                  flush=True)
+
+        acceptable = [b for b in backends
+                      if b == "fp32" or results[model][b].get("rouge_vs_fp32", {}).get("rougeL", 0) >= args.min_rouge]
+        best = max(acceptable, key=lambda b: results[model][b]["chunks_per_sec"])
+        results[model]["recommended_backend"] = best
+        print(f"inference {model}: recommended backend {best} (ROUGE-L >= {args.min_rouge})")
+    return results
+
+
+# -------------------------------
+# Baseline comparison
+# -------------------------------
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(current, baseline, threshold, min_delta_ms=0.05):
+    """
+    Changed metrics between two result sets; regressions are slower latencies
+    (by more than min_delta_ms, so sub-microsecond jitter is ignored) or lower throughput
+    """
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    changes, regressions = [], []
+    for key in sorted(now.keys() & before.keys()):
+        old, new = before[key], now[key]
+        if not old:
+            continue
+        ratio = new / old
+        if key.endswith(("p50_ms", "p95_ms", "p99_ms")):
+            worse = ratio > 1 + threshold and new - old > min_delta_ms
+        elif key.endswith("per_sec"):
+            worse = ratio < 1 - threshold
+        else:
+            continue
+        change = {"metric": key, "baseline": old, "current": new, "ratio": round(ratio, 3)}
+        changes.append(change)
+        if worse:
+            regressions.append(change)
+    return {"threshold": threshold, "min_delta_ms": min_delta_ms, "changes": changes, "regressions": regressions}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(args):
+    catalog = Catalog.from_csv(args.csv)
+    titles = catalog.titles
+    links = [catalog.link(i) for i in range(len(catalog))]
+
+    suites = {"search": bench_search, "suggest": bench_suggest, "extract": bench_extract,
+              "summarize": bench_summarize, "inference": bench_inference}
+    report = {"meta": environment(), "config": {k: v for k, v in vars(args).items() if k not in ("compare",)},
+              "results": {}}
+    for name in args.suites:
+        report["results"][name] = suites[name](args, titles, links)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.threshold, args.min_delta_ms)
+        for change in report["comparison"]["regressions"]:
+            print(f"[REGRESSION] {change['metric']}: {change['baseline']} -> {change['current']} "
+                  f"(x{change['ratio']})")
+        if args.fail_on_regression and report["comparison"]["regressions"]:
+            exit_code = 1
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Wrote {path}")
+    return exit_code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for search, extraction and summarization")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--csv", default=str(Config.CSV_FILE), help="catalog CSV the synthetic catalogs scale from")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100], help="catalog multiples (up to 1000)")
+    parser.add_argument("--queries", type=int, default=200, help="queries per search/suggest run")
+    parser.add_argument("--pdf-dir", default=str(Config.DATA_DIR / "uploads"), help="fixture PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the fixture PDFs")
+    parser.add_argument("--models", nargs="+", default=["stub", "t5-small"])
+    parser.add_argument("--batch-size", type=int, default=Config.SUMMARY_BATCH_SIZE)
+    parser.add_argument("--max-chunks", type=int, default=32)
+    parser.add_argument("--max-len", type=int, default=120, help="max summary tokens per chunk")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS),
+                        help="inference backends compared against fp32")
+    parser.add_argument("--inference-models", nargs="+", default=["t5-small"])
+    parser.add_argument("--intra-op-threads", type=int, default=Config.TORCH_INTRA_OP_THREADS)
+    parser.add_argument("--inter-op-threads", type=int, default=Config.TORCH_INTER_OP_THREADS)
+    parser.add_argument("--min-rouge", type=float, default=0.9,
+                        help="lowest mean ROUGE-L vs fp32 for a backend to be recommended")
+    parser.add_argument("--output", default="benchmarks/latest.json")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--compare", help="baseline JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore latency changes smaller than this")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a regression is found")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -24,18 +24,56 @@ class Config:
     
     # CSV file settings
     CSV_FILE = DATA_DIR / 'SB_publication_PMC.csv'
+    CATALOG_FILE = CACHE_DIR / 'catalog.bin'  # compiled snapshot, rebuilt when the CSV changes
     
     # PDF processing settings
     MAX_PDF_SIZE_MB = 50  # Maximum PDF file size in MB
     PDF_TIMEOUT = 30      # Timeout for PDF download in seconds
     MAX_RETRIES = 3       # Maximum download retries
+    EXTRACT_WORKERS = int(os.environ.get('EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))  # page-parallel extraction
+    
+    # Summarization settings
+    SUMMARY_BATCH_SIZE = int(os.environ.get('SUMMARY_BATCH_SIZE', 8))  # chunks per forward pass
+    MICRO_BATCHING = os.environ.get('MICRO_BATCHING', 'False').lower() == 'true'
+    MICRO_BATCH_MAX_SIZE = 16   # chunks merged across concurrent requests
+    MICRO_BATCH_WAIT_MS = 20    # how long the scheduler waits to fill a batch
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'fp32')  # 'fp32' or 'int8' (dynamic quantization)
+    TORCH_INTRA_OP_THREADS = int(os.environ.get('TORCH_INTRA_OP_THREADS', 0))  # 0 = torch default (all cores)
+    TORCH_INTER_OP_THREADS = int(os.environ.get('TORCH_INTER_OP_THREADS', 0))
+    INFERENCE_SLOTS = int(os.environ.get('INFERENCE_SLOTS', 0))  # concurrent summarizer calls per process (0 = no cap)
+    
+    # Production serving (serve.py: preload once, then fork workers)
+    SERVE_WORKERS = int(os.environ.get('SERVE_WORKERS', os.cpu_count() or 1))
+    
+    # Background analysis jobs
+    ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 2))  # concurrent analyses
+    MAX_PENDING_JOBS = 64
     
     # Search settings
     RESULTS_PER_PAGE = 10
     MAX_RESULTS_PER_PAGE = 50
+    SEMANTIC_DIR = CACHE_DIR / 'semantic'  # TF-IDF + SVD embeddings (.npy, memory-mapped)
+    SEMANTIC_DIM = int(os.environ.get('SEMANTIC_DIM', 128))
+    SEMANTIC_MIN_SIMILARITY = 0.2          # cosine below which a document is not a semantic match
+    GRAPH_DIR = CACHE_DIR / 'graph'        # term co-occurrence graph (CSR arrays + delta overlay)
+    RELATED_DIR = CACHE_DIR / 'related'    # MinHash signatures for "related publications"
+    RELATED_PAPERS = 5                     # shown on the publication page
+    ANALYSIS_SYNC_SECONDS = 10             # how often a process applies analyses cached by other processes
+    SEARCH_BATCH_MAX_QUERIES = int(os.environ.get('SEARCH_BATCH_MAX_QUERIES', 10000))  # per /api/search/batch request
+    SEARCH_BATCH_MAX_K = 50                # results per query in a batch
     
     # Cache settings
-    CACHE_EXPIRY_HOURS = 24  # Hours before cache expires
+    CACHE_EXPIRY_HOURS = float(os.environ.get('CACHE_EXPIRY_HOURS', 24))  # Hours before analyses expire (0 = never)
+    CACHE_MAX_PDF_MB = 2048       # Byte budgets, least recently used entries are evicted first
+    CACHE_MAX_TEXT_MB = 1024
+    CACHE_MAX_ANALYSIS_MB = 256
+    CACHE_MAX_CHUNK_MB = 128      # Per-chunk summaries, reused when a paper is summarized again
+    CACHE_HOT_ITEMS = 256         # In-process hot tier in front of the SQLite store
+    
+    # Instrumentation (/metrics is always on; profiling is opt-in)
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'False').lower() == 'true'  # honour ?profile=1
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # fraction profiled automatically
+    PROFILE_DIR = CACHE_DIR / 'profiles'
     
     # Request settings
     USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
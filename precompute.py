@@ -0,0 +1,224 @@
+"""
+Offline bulk precompute for NASA Bioscience Explorer.
+
+Walks the publication catalog and runs the PDFProcessor stages as a pipeline:
+  fetch (thread pool, bounded concurrency) -> extract (process pool)
+  -> summarize (one batched model worker) -> cache
+
+Publications with a live cached analysis are skipped, so a killed run resumes
+where it stopped and analyses that expired (CACHE_EXPIRY_HOURS) are redone.
+The checkpoint records what each run finished and which publications failed.
+
+Examples:
+  python precompute.py                                  # whole catalog
+  python precompute.py --limit 20 --fetch-concurrency 4
+  python precompute.py --from-dir data/uploads --stub-model --cache-dir /tmp/pc
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from config import Config
+from services.ai_analyzer import AIAnalyzer, BACKENDS
+from services.cache_store import CacheStore
+from services.catalog import load_catalog
+from services.model_registry import registry
+from services.pdf_processor import PDFProcessor, extract_to_store
+
+
+class StubSummarizer:
+    """Model-free stand-in for the HF pipeline: echoes the first words of each input"""
+
+    def __call__(self, inputs, max_length=60, **kwargs):
+        single = isinstance(inputs, str)
+        outputs = []
+        for text in [inputs] if single else inputs:
+            body = text.split("\n")[-1]
+            outputs.append({"summary_text": " ".join(body.split()[:max_length // 2])})
+        return outputs
+
+
+class Checkpoint:
+    def __init__(self, path):
+        """Done/failed publication ids, rewritten atomically after every document"""
+        self.path = Path(path)
+        self.done, self.failed = set(), {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.done = set(data.get("done", []))
+            self.failed = data.get("failed", {})
+
+    def mark(self, key, error=None):
+        key = str(key)
+        if error is None:
+            self.done.add(key)
+            self.failed.pop(key, None)
+        else:
+            self.failed[key] = error
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"done": sorted(self.done), "failed": self.failed}, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+
+    def update(self, ok=True):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        finished = self.done + self.failed
+        elapsed = time.perf_counter() - self.start
+        rate = finished / elapsed if elapsed else 0.0
+        eta = (self.total - finished) / rate if rate else float("inf")
+        print(f"[{finished}/{self.total}] ok={self.done} failed={self.failed} "
+              f"{rate * 60:.1f} docs/min, ETA {eta / 60:.1f} min", flush=True)
+
+
+def load_jobs(args):
+    """Return list of (pub_id, pub) pairs; pub is a dict with Title/Link"""
+    if args.from_dir:
+        pdfs = sorted(Path(args.from_dir).glob("*.pdf"))
+        return [(f"local_{i}", {"Title": p.stem, "Link": str(p), "pdf_path": p}) for i, p in enumerate(pdfs)]
+
+    catalog = load_catalog(args.csv, args.catalog)
+    return [(pub_id, catalog.record(pub_id)) for pub_id in range(len(catalog))]
+
+
+def run(args):
+    if args.stub_model:
+        registry.register("summarizer:stub", StubSummarizer)
+    cache = CacheStore.from_config(args.cache_dir)
+    analyzer = AIAnalyzer(args.model, batch_size=args.batch_size, cache=cache,
+                          backend="fp32" if args.stub_model else args.backend,
+                          intra_op_threads=args.intra_op_threads, inter_op_threads=args.inter_op_threads)
+    processor = PDFProcessor(cache_dir=args.cache_dir, ai_analyzer=analyzer, cache_store=cache)
+    checkpoint = Checkpoint(args.checkpoint or Path(args.cache_dir) / "precompute_checkpoint.json")
+
+    jobs = load_jobs(args)
+    # The cache alone decides what is done: ids in checkpoint.done whose analysis expired are redone
+    pending = [(pub_id, pub) for pub_id, pub in jobs
+               if processor.get_cached(pub_id) is None
+               and not (args.skip_failed and str(pub_id) in checkpoint.failed)]
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"{len(jobs)} publications, {len(jobs) - len(pending)} already done, {len(pending)} to process")
+    if not pending:
+        return 0
+
+    progress = Progress(len(pending))
+    text_dir = str(processor.text_store.store_dir)
+    queue = iter(pending)
+    window = args.fetch_concurrency + args.extract_workers * 2  # bounds fetched-but-unsummarized docs
+
+    def fetch(pub_id, pub):
+        if "pdf_path" in pub:  # offline fixture
+            return {"source": "PDF", "pdf_path": pub["pdf_path"]}
+        return processor.fetch_source(pub, pub_id)
+
+    with ThreadPoolExecutor(args.fetch_concurrency, thread_name_prefix="fetch") as fetchers, \
+            ProcessPoolExecutor(args.extract_workers) as extractors:
+        in_flight = {}  # future -> (stage, pub_id, pub, source)
+        ready = []      # (pub_id, pub, source, text, text_key, document) waiting for the model
+
+        def refill():
+            while len(in_flight) + len(ready) < window:
+                try:
+                    pub_id, pub = next(queue)
+                except StopIteration:
+                    return
+                in_flight[fetchers.submit(fetch, pub_id, pub)] = ("fetch", pub_id, pub, None)
+
+        def fail(pub_id, error):
+            print(f"[WARN] {pub_id}: {error}")
+            checkpoint.mark(pub_id, str(error))
+            progress.update(ok=False)
+
+        def summarize_ready(force=False):
+            while ready and (force or len(ready) >= args.batch_docs):
+                batch, ready[:] = ready[:args.batch_docs], ready[args.batch_docs:]
+                try:
+                    summaries = analyzer.summarize_many([item[5] or item[3] for item in batch])
+                except Exception as e:
+                    for item in batch:
+                        fail(item[0], e)
+                    continue
+                for (pub_id, pub, source, text, text_key, _), summary in zip(batch, summaries):
+                    processor.finalize(pub, pub_id, source, text, summary, text_key)
+                    checkpoint.mark(pub_id)
+                    progress.update()
+
+        refill()
+        while in_flight or ready:
+            if in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, pub_id, pub, source = in_flight.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        fail(pub_id, e)
+                        continue
+                    if stage == "fetch" and value.get("text"):
+                        ready.append((pub_id, pub, value["source"], value["text"], None, value.get("document")))
+                    elif stage == "fetch":
+                        in_flight[extractors.submit(extract_to_store, str(value["pdf_path"]), text_dir)] = (
+                            "extract", pub_id, pub, value["source"])
+                    elif value[1]:
+                        text_key, text = value
+                        ready.append((pub_id, pub, source, text, text_key, None))
+                    else:
+                        fail(pub_id, "no text extracted")
+
+            summarize_ready(force=not in_flight)
+            refill()
+
+    stats = analyzer.stats()["direct"]
+    print(f"Finished: {progress.done} ok, {progress.failed} failed, "
+          f"{stats['chunks_per_sec']} chunks/sec over {stats['chunks']} chunks")
+    return 0 if progress.failed == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute analyses for the whole publication catalog")
+    parser.add_argument("--csv", default=str(Config.CSV_FILE), help="catalog CSV (Title, Link)")
+    parser.add_argument("--catalog", default=str(Config.CATALOG_FILE), help="compiled catalog snapshot")
+    parser.add_argument("--from-dir", help="process local PDFs in this directory instead of the catalog (offline)")
+    parser.add_argument("--cache-dir", default=str(Config.CACHE_DIR))
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <cache-dir>/precompute_checkpoint.json)")
+    parser.add_argument("--limit", type=int, help="process at most N publications")
+    parser.add_argument("--fetch-concurrency", type=int, default=4, help="concurrent network fetches")
+    parser.add_argument("--extract-workers", type=int, default=max((os.cpu_count() or 2) - 1, 1))
+    parser.add_argument("--batch-docs", type=int, default=4, help="documents summarized per batched pass")
+    parser.add_argument("--batch-size", type=int, default=Config.SUMMARY_BATCH_SIZE, help="chunks per forward pass")
+    parser.add_argument("--model", default="t5-small")
+    parser.add_argument("--stub-model", action="store_true", help="use a model-free stub summarizer")
+    parser.add_argument("--backend", choices=BACKENDS, default=Config.INFERENCE_BACKEND,
+                        help="fp32, or int8 (dynamically quantized linear layers)")
+    parser.add_argument("--intra-op-threads", type=int, default=Config.TORCH_INTRA_OP_THREADS)
+    parser.add_argument("--inter-op-threads", type=int, default=Config.TORCH_INTER_OP_THREADS)
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry ids that failed before")
+    args = parser.parse_args(argv)
+    if args.stub_model:
+        args.model = "stub"
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
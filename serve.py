@@ -0,0 +1,211 @@
+"""
+Production entry point: preload once, then fork workers.
+
+The parent process loads everything expensive before forking: the catalog
+snapshot, search/semantic indexes, knowledge graph, related-papers index and
+(unless --no-models) the summarizer weights. It then moves the objects that
+survive into the GC's permanent generation (gc.freeze), so collections in the
+workers never write to them. The forked workers therefore share those pages
+copy-on-write instead of holding one copy each. All workers accept on one
+listening socket opened by the parent, and the kernel spreads connections
+across them.
+
+Each worker:
+  - pins torch to its share of the cores (--intra-op-threads, default
+    cores // workers, and --inter-op-threads)
+  - caps concurrent summarizer calls with --inference-slots
+  - reports its RSS / PSS / shared memory at /api/worker and in /metrics
+
+The knowledge graph and related-papers index have exactly one writer, the
+parent. Workers keep their own in-memory copies but never save them. Every
+process, parent included, applies analyses from the shared cache every
+ANALYSIS_SYNC_SECONDS (app.sync_analyses; a background thread in each
+worker, the supervisor loop in the parent), so the copies converge. The parent saves each
+snapshot to a new versioned directory and switches to it atomically
+(services.snapshot), and it writes pending updates on shutdown.
+
+The parent restarts workers that die and logs the memory of every worker
+each --stats-interval seconds. PSS is the fair share of a page among the
+processes mapping it, so the summed PSS is the real footprint. A growing
+private_dirty means shared pages are being copied.
+
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 2 --inference-slots 1 --no-models
+"""
+
+import argparse
+import gc
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+
+from config import Config
+
+MB = 1024 * 1024
+
+
+def listen(host, port, backlog=2048):
+    """The listening socket every worker accepts on (non-blocking: idle workers must not hang in accept)"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload(webapp, load_models=True):
+    """Load shared state in the parent, then freeze it out of the GC's reach"""
+    start = time.perf_counter()
+    if not webapp.load_data():
+        raise SystemExit("Failed to load data. Please check your CSV file.")
+    if load_models:
+        webapp.registry.warm_up(background=False)
+    gc.collect()
+    gc.freeze()
+    print(f"Preloaded in {time.perf_counter() - start:.1f}s: {gc.get_freeze_count()} objects frozen, "
+          f"{webapp.current_rss_bytes() / MB:.0f} MB RSS")
+
+
+def pin_threads(intra_op, inter_op):
+    from services.ai_analyzer import configure_torch_threads, reset_torch_threads
+    reset_torch_threads()
+    if importlib.util.find_spec("torch") is not None:
+        configure_torch_threads(intra_op, inter_op)
+
+
+def exit_worker(signum, frame):
+    raise SystemExit(0)
+
+
+def run_worker(webapp, sock, args, index):
+    from werkzeug.serving import make_server
+    from services.batch_scheduler import inference_slots
+    from services.pdf_processor import shutdown_page_pool
+
+    signal.signal(signal.SIGTERM, exit_worker)  # unwind, so the extraction pool is stopped too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl-C and stops workers itself
+    pin_threads(args.intra_op_threads, args.inter_op_threads)
+    inference_slots.configure(args.inference_slots)
+    webapp.knowledge_graph.read_only = True  # the parent owns the snapshots
+    webapp.related_index.read_only = True
+    webapp.start_analysis_sync()  # started after fork: the parent must not fork with threads running
+
+    server = make_server(args.host, args.port, webapp.app, threaded=True, fd=sock.fileno())
+    print(f"[worker {index}] pid {os.getpid()} serving on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        shutdown_page_pool()
+
+
+class Supervisor:
+    def __init__(self, webapp, sock, args):
+        """Forks the workers, restarts the ones that die, and stops them all on SIGTERM/SIGINT;
+        meanwhile it follows new analyses and is the only process that saves the graph and related index"""
+        self.webapp = webapp
+        self.sock = sock
+        self.args = args
+        self.workers = {}  # pid -> worker index
+        self.stopping = False
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.webapp, self.sock, self.args, index)
+            except Exception as e:
+                print(f"[worker {index}] crashed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = index
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(self):
+        from services.model_registry import memory_breakdown
+        total_pss = 0
+        for pid, index in sorted(self.workers.items(), key=lambda item: item[1]):
+            memory = memory_breakdown(pid)
+            total_pss += memory.get("pss", 0)
+            print(f"[worker {index}] pid {pid}: rss {memory.get('rss', 0) / MB:.0f} MB, "
+                  f"pss {memory.get('pss', 0) / MB:.0f} MB, shared {memory.get('shared', 0) / MB:.0f} MB, "
+                  f"private dirty {memory.get('private_dirty', 0) / MB:.0f} MB", flush=True)
+        parent = memory_breakdown()
+        print(f"[parent] pss {parent.get('pss', 0) / MB:.0f} MB; total pss "
+              f"{(total_pss + parent.get('pss', 0)) / MB:.0f} MB across {len(self.workers)} workers", flush=True)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.args.workers):
+            self.spawn(index)
+
+        next_report = time.monotonic() + self.args.stats_interval
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                index = self.workers.pop(pid)
+                if not self.stopping:
+                    print(f"[worker {index}] pid {pid} exited ({status}), restarting", flush=True)
+                    self.spawn(index)
+                continue
+            if self.args.stats_interval and time.monotonic() >= next_report and not self.stopping:
+                self.report()
+                next_report = time.monotonic() + self.args.stats_interval
+            if not self.stopping:
+                self.webapp.sync_analyses()
+            time.sleep(0.2)
+        self.sock.close()
+        self.webapp.sync_analyses(force=True)
+        self.webapp.persist_indexes()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the app from N forked workers sharing preloaded state")
+    parser.add_argument("--host", default=os.environ.get("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=Config.SERVE_WORKERS)
+    parser.add_argument("--inference-slots", type=int, default=Config.INFERENCE_SLOTS or 1,
+                        help="concurrent summarizer calls per worker")
+    parser.add_argument("--intra-op-threads", type=int, default=Config.TORCH_INTRA_OP_THREADS,
+                        help="torch threads per worker (default: cores // workers)")
+    parser.add_argument("--inter-op-threads", type=int, default=Config.TORCH_INTER_OP_THREADS or 1)
+    parser.add_argument("--no-models", action="store_true", help="do not preload summarizer weights")
+    parser.add_argument("--stats-interval", type=float, default=60.0,
+                        help="seconds between worker memory reports (0 = off)")
+    args = parser.parse_args(argv)
+    args.workers = max(args.workers, 1)
+    if not args.intra_op_threads:
+        args.intra_op_threads = max((os.cpu_count() or 1) // args.workers, 1)
+
+    sock = listen(args.host, args.port)
+    import app as webapp
+
+    preload(webapp, load_models=not args.no_models)
+    if not hasattr(os, "fork"):  # Windows: no fork, one process
+        print("os.fork is unavailable; serving from a single process")
+        run_worker(webapp, sock, args, 0)
+        return 0
+    Supervisor(webapp, sock, args).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,85 +1,543 @@
-from transformers import pipeline
+import hashlib
+import json
+import os
+import re
+import time
 import nltk
-nltk.download('punkt')
-from nltk.tokenize import sent_tokenize
+from services.model_registry import registry
+from services.batch_scheduler import ThroughputStats, inference_slots
+from services.lru_cache import LRUCache
+from services.document import Document
+from services.metrics import SUMMARIZER_SECONDS, SUMMARIZER_CHUNKS, record_cache
+
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR', r'D:\nltk_data')  # change to any local folder you prefer
+
+
+def _regex_sent_tokenize(text):
+    return [s for s in re.split(r'(?<=[.!?])\s+', text) if s]
+
+
+def _load_punkt():
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.append(NLTK_DATA_DIR)
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt', download_dir=NLTK_DATA_DIR)
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            # Offline without punkt: a plain punctuation split is good enough for chunking
+            print("[WARN] NLTK punkt unavailable, using regex sentence splitting")
+            return _regex_sent_tokenize
+    from nltk.tokenize import sent_tokenize
+    return sent_tokenize
+
+
+def sent_tokenize(text):
+    """NLTK sentence splitter; punkt is found/downloaded on first use, not at import"""
+    return registry.get("nltk:punkt", _load_punkt)(text)
+
+
+BACKENDS = ("fp32", "int8")
+
+_threads_configured = False
+
+
+def configure_torch_threads(intra_op=0, inter_op=0):
+    """
+    Pin torch's intra-op (per-operator) and inter-op (parallel operators)
+    thread pools for this process; 0 keeps torch's default. Inter-op threads
+    can only be set before torch starts any parallel work, so the first call
+    in a process wins. Call it again in each worker after a fork.
+    """
+    global _threads_configured
+    if _threads_configured:
+        return
+    import torch
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_interop_threads(inter_op)
+        except RuntimeError as e:  # parallel work already ran in this process
+            print(f"[WARN] Could not set inter-op threads: {e}")
+    _threads_configured = True
+
+
+def reset_torch_threads():
+    """Allow configure_torch_threads() to run again (e.g. in a freshly forked worker)"""
+    global _threads_configured
+    _threads_configured = False
+
+
+class InferencePipeline:
+    """A summarization pipeline whose calls run under torch.inference_mode()"""
+
+    def __init__(self, pipeline, backend):
+        self.pipeline = pipeline
+        self.backend = backend
+
+    def __call__(self, *args, **kwargs):
+        import torch
+        with torch.inference_mode():
+            return self.pipeline(*args, **kwargs)
+
+    def __getattr__(self, name):  # tokenizer, model, ...
+        return getattr(self.pipeline, name)
+
+
+def quantize_dynamic_int8(model):
+    """Replace the model's nn.Linear layers with dynamically quantized int8 ones (weights int8, activations fp32)"""
+    import torch
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("fbgemm", "x86", "qnnpack"):  # fbgemm/x86 on Intel/AMD, qnnpack on ARM
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            break
+    quantization = getattr(torch, "ao", torch).quantization
+    return quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _pipeline_loader(model_name, backend="fp32", intra_op_threads=0, inter_op_threads=0):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    def _load():
+        from transformers import pipeline
+        configure_torch_threads(intra_op_threads, inter_op_threads)
+        print(f"Initializing summarizer model {model_name} ({backend})...")
+        summarizer = pipeline("summarization", model=model_name, device=-1)
+        if backend == "int8":
+            summarizer.model = quantize_dynamic_int8(summarizer.model)
+        summarizer.model.eval()
+        return InferencePipeline(summarizer, backend)
+    return _load
+
+
+def pipeline_name(model_name, backend="fp32"):
+    """Registry key of a summarizer; fp32 keeps the plain model name"""
+    return f"summarizer:{model_name}" if backend == "fp32" else f"summarizer:{model_name}:{backend}"
+
+
+def summarization_pipeline(model_name, backend="fp32", intra_op_threads=0, inter_op_threads=0):
+    """
+    Shared HuggingFace summarization pipeline for model_name/backend (loaded
+    once per process); the thread counts pin torch when this call loads it
+    """
+    return registry.get(pipeline_name(model_name, backend),
+                        _pipeline_loader(model_name, backend, intra_op_threads, inter_op_threads))
+
 
 class AIAnalyzer:
-    def __init__(self, model_name="sshleifer/distilbart-cnn-12-6"):
+    # Prompt/special tokens the tokenizer count of the packed text does not see
+    TOKEN_MARGIN = 16
+    # Shortest summary cap a reduce round is retried with before giving up on shrinking
+    MIN_REDUCE_LENGTH = 48
+
+    INSTRUCTIONS = (
+        "Summarize this paper focusing on:\n"
+        "- Methodology and experimental approach\n"
+        "- Specific methods and techniques used\n"
+        "- Key results and findings\n"
+        "- Discussion and implications\n"
+        "Keep it precise, structured, and detailed."
+    )
+    REDUCE_INSTRUCTIONS = (
+        "Combine these partial summaries of one paper into a single summary of its "
+        "methodology, methods, key results and implications. Keep it precise and detailed."
+    )
+    # Token budget per section type fed to the summarizer (None = no cap);
+    # other sections (references, tables, acknowledgements, ...) are skipped
+    SECTION_BUDGETS = {
+        "FRONT": 384,
+        "ABSTRACT": 512,
+        "INTRO": 384,
+        "METHODS": 1536,
+        "RESULTS": 1536,
+        "DISCUSS": 1024,
+        "CONCL": 512,
+        "UNKNOWN": None,
+    }
+    KNOWLEDGE_GAP_PROMPT = (
+        "Based on this summary, identify:\n"
+        "- Potential research gaps\n"
+        "- Limitations\n"
+        "- Open questions for future research"
+    )
+
+    def __init__(self, model_name="sshleifer/distilbart-cnn-12-6", batch_size=8, scheduler=None, cache=None,
+                 section_budgets=None, backend="fp32", intra_op_threads=0, inter_op_threads=0):
         """
         Advanced AI Analyzer for scientific papers:
         - Summarization focused on Methodology, Methods, Results, Discussion
-        - Chunked processing for long documents
+        - Only the sections in section_budgets are read, each up to its token
+          budget (PDF text is split at detected headings first)
+        - Sentences are packed into chunks by the model's own tokenizer, up to
+          its context limit, and every chunk is summarized (map); chunk
+          summaries are summarized again in groups until they fit one window
+          (reduce), all documents of a level sharing one batched pass
+        - Chunk summaries are cached by content hash (in `cache`, a CacheStore,
+          or in process), so re-runs only pay for chunks that changed
+        - The model comes from the shared registry on first use, so
+          constructing an analyzer is free and instances share weights
+        - scheduler: optional MicroBatcher merging chunks across requests
+        - backend: "fp32" (stock weights) or "int8" (nn.Linear layers dynamically
+          quantized); either runs on the CPU under torch.inference_mode, with
+          torch's thread pools pinned to intra_op_threads / inter_op_threads
+          (0 = torch default) when the model loads
         """
-        print("Initializing summarizer model...")
-        self.summarizer = pipeline("summarization", model=model_name)
-
-    def _chunk_text(self, text, max_chunk_size=1000):
-        sentences = sent_tokenize(text)
-        chunks, chunk, chunk_len = [], [], 0
-
-        for sentence in sentences:
-            chunk_len += len(sentence)
-            chunk.append(sentence)
-            if chunk_len >= max_chunk_size:
-                chunks.append(" ".join(chunk))
-                chunk, chunk_len = [], 0
-
-        if chunk:
-            chunks.append(" ".join(chunk))
-        return chunks
-
-    def summarize(self, text: str, max_len: int = 250, min_len: int = 80) -> str:
-        if not text:
-            return "No text available for summarization."
-
-        chunks = self._chunk_text(text, max_chunk_size=1200)
-        summaries = []
-
-        instructions = (
-            "Summarize this paper focusing on:\n"
-            "- Methodology and experimental approach\n"
-            "- Specific methods and techniques used\n"
-            "- Key results and findings\n"
-            "- Discussion and implications\n"
-            "Keep it precise, structured, and detailed."
-        )
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = (intra_op_threads, inter_op_threads)
+        self.batch_size = batch_size
+        self.scheduler = scheduler
+        self.cache = cache
+        self.section_budgets = section_budgets or self.SECTION_BUDGETS
+        self._memo = LRUCache(maxsize=4096)
+        self.throughput = ThroughputStats()
+        registry.register("nltk:punkt", _load_punkt)
+        registry.register(pipeline_name(model_name, backend), _pipeline_loader(model_name, backend, *self.threads))
+
+    @property
+    def model_label(self):
+        """model_name, suffixed with the backend unless it is fp32 (metrics label, cache key part)"""
+        return self.model_name if self.backend == "fp32" else f"{self.model_name}:{self.backend}"
+
+    @property
+    def summarizer(self):
+        return summarization_pipeline(self.model_name, self.backend, *self.threads)
 
-        # Process chunks
-        for chunk in chunks[:7]:
+    def stats(self):
+        """Chunks/sec for this analyzer's direct calls (plus the scheduler's, if any)"""
+        stats = {"model": self.model_name, "backend": self.backend, "batch_size": self.batch_size,
+                 "direct": self.throughput.snapshot()}
+        if self.scheduler is not None:
+            stats["micro_batched"] = self.scheduler.stats.snapshot()
+        return stats
+
+    # -------------------------------
+    # Generation
+    # -------------------------------
+    def _generate(self, inputs, **gen_kwargs):
+        """
+        Summarize a list of inputs in as few forward passes as possible.
+        Returns one summary (or None on failure) per input.
+        """
+        if not inputs:
+            return []
+        gen_kwargs.setdefault("do_sample", False)
+        gen_kwargs.setdefault("truncation", True)
+
+        if self.scheduler is not None:
             try:
-                result = self.summarizer(
-                    instructions + "\n" + chunk,
-                    max_length=max_len,
-                    min_length=min_len,
-                    do_sample=False
-                )
-                summaries.append(result[0]['summary_text'])
+                start = time.perf_counter()
+                outputs = self.scheduler.submit(self.summarizer, inputs, **gen_kwargs)
+                self._observe(len(inputs), time.perf_counter() - start)
+                return [output["summary_text"] for output in outputs]
             except Exception as e:
-                print(f"[WARN] Chunk summarization failed: {e}")
-                continue
+                print(f"[WARN] Micro-batched summarization failed, retrying per chunk: {e}")
+                return [self._generate_one(text, **gen_kwargs) for text in inputs]
 
-        combined_summary = " ".join(summaries)
+        try:
+            with inference_slots.hold():  # time waiting for a slot is not model time
+                start = time.perf_counter()
+                outputs = self.summarizer(inputs, batch_size=self.batch_size, **gen_kwargs)
+                seconds = time.perf_counter() - start
+        except Exception as e:
+            # One bad chunk should not cost the whole document: retry one by one
+            print(f"[WARN] Batched summarization failed, retrying per chunk: {e}")
+            return [self._generate_one(text, **gen_kwargs) for text in inputs]
+        self._observe(len(inputs), seconds)
+        return [output["summary_text"] for output in outputs]
 
-        # Knowledge gaps
-        knowledge_gap_prompt = (
-            "Based on this summary, identify:\n"
-            "- Potential research gaps\n"
-            "- Limitations\n"
-            "- Open questions for future research"
-        )
+    def _generate_one(self, text, **gen_kwargs):
         try:
-            gap_result = self.summarizer(
-                knowledge_gap_prompt + "\n" + combined_summary,
-                max_length=200,
-                min_length=80,
-                do_sample=False
-            )
-            knowledge_gaps = gap_result[0]['summary_text']
+            with inference_slots.hold():
+                start = time.perf_counter()
+                result = self.summarizer(text, **gen_kwargs)
+                seconds = time.perf_counter() - start
         except Exception as e:
-            print(f"[WARN] Knowledge gap generation failed: {e}")
-            knowledge_gaps = "Could not generate knowledge gaps due to memory constraints."
+            print(f"[WARN] Chunk summarization failed: {e}")
+            return None
+        self._observe(1, seconds)
+        return result[0]["summary_text"]
+
+    def _observe(self, chunks, seconds):
+        if self.scheduler is None:  # the scheduler keeps its own throughput stats
+            self.throughput.record(chunks, seconds)
+        SUMMARIZER_SECONDS.observe(seconds, model=self.model_label)
+        SUMMARIZER_CHUNKS.inc(chunks, model=self.model_label)
+
+    def _cache_key(self, text, gen_kwargs):
+        payload = json.dumps([self.model_label, text, sorted(gen_kwargs.items())])
+        return "chunk:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _generate_cached(self, inputs, **gen_kwargs):
+        """
+        _generate, skipping inputs whose summary is already cached (and
+        duplicates). Chunk summaries bypass the store's hot tier, so a long
+        paper cannot push full analyses out of it; the in-process _memo LRU
+        is their hot tier instead.
+        """
+        keys = [self._cache_key(text, gen_kwargs) for text in inputs]
+        results = {}
+        for key in set(keys):
+            cached = self._memo.get(key)
+            if cached is None and self.cache is not None:
+                cached = self.cache.get_json(key, hot=False)  # counted by the store
+                if cached is not None:
+                    self._memo.put(key, cached)
+            else:
+                record_cache("chunk", cached is not None)
+            if cached is not None:
+                results[key] = cached
+
+        missing = {}
+        for key, text in zip(keys, inputs):
+            if key not in results:
+                missing.setdefault(key, text)
+        for key, summary in zip(missing, self._generate(list(missing.values()), **gen_kwargs)):
+            results[key] = summary
+            if summary:
+                self._memo.put(key, summary)
+                if self.cache is not None:
+                    self.cache.put_json(key, summary, kind="chunk", ttl=0, hot=False)
+        return [results[key] for key in keys]
+
+    # -------------------------------
+    # Token-aware chunking
+    # -------------------------------
+    @property
+    def tokenizer(self):
+        return getattr(self.summarizer, "tokenizer", None)
+
+    def context_limit(self):
+        """Input tokens the model accepts (tokenizer limit, else the model config, else 512)"""
+        limit = getattr(self.tokenizer, "model_max_length", None)
+        if not limit or limit > 100_000:  # "unset" sentinel on some tokenizers
+            config = getattr(getattr(self.summarizer, "model", None), "config", None)
+            limit = getattr(config, "max_position_embeddings", None) or getattr(config, "n_positions", None) or 512
+        return int(limit)
+
+    def count_tokens(self, texts):
+        """Token count per text (whitespace words when the model has no tokenizer)"""
+        if not texts:
+            return []
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return [len(text.split()) for text in texts]
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
 
+    def token_budget(self, prompt):
+        """Tokens left for content after the prompt, within one context window"""
+        return max(self.context_limit() - self.count_tokens([prompt])[0] - self.TOKEN_MARGIN, 32)
+
+    def _split_long(self, text, budget):
+        """Cut a piece longer than budget into budget-sized token windows"""
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            words = text.split()
+            return [" ".join(words[i:i + budget]) for i in range(0, len(words), budget)]
+        ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+        return [tokenizer.decode(ids[i:i + budget]) for i in range(0, len(ids), budget)]
+
+    def _pack(self, pieces, budget):
+        """Greedily join consecutive pieces into groups of at most budget tokens"""
+        groups, group, used = [], [], 0
+        for piece, count in zip(pieces, self.count_tokens(pieces)):
+            if count > budget:
+                parts = self._split_long(piece, budget)
+                pieces_counts = zip(parts, self.count_tokens(parts))
+            else:
+                pieces_counts = [(piece, count)]
+            for part, part_count in pieces_counts:
+                if group and used + part_count > budget:
+                    groups.append(" ".join(group))
+                    group, used = [], 0
+                group.append(part)
+                used += part_count
+        if group:
+            groups.append(" ".join(group))
+        return groups
+
+    def _chunk_text(self, text, budget=None):
+        """Sentences packed up to the model's context window (minus the prompt)"""
+        budget = budget or self.token_budget(self.INSTRUCTIONS)
+        return self._pack(sent_tokenize(text), budget)
+
+    def _document_sentences(self, document):
+        """Sentences of the budgeted sections, each section type capped at its token budget"""
+        sentences, used = [], {}
+        for section in document.sections:
+            if section.kind not in self.section_budgets:
+                continue
+            budget = self.section_budgets[section.kind]
+            section_sentences = sent_tokenize(section.text)
+            if budget is None:
+                sentences.extend(section_sentences)
+                continue
+            for sentence, count in zip(section_sentences, self.count_tokens(section_sentences)):
+                if used.get(section.kind, 0) + count > budget:
+                    break
+                used[section.kind] = used.get(section.kind, 0) + count
+                sentences.append(sentence)
+
+        # Nothing summarizable recognised (e.g. only references): fall back to everything
+        return sentences or sent_tokenize(document.text)
+
+    # -------------------------------
+    # Summarization
+    # -------------------------------
+    def _map_parts(self, text, chunk_budget):
+        """Packed chunks for a string or Document (None when there is no text)"""
+        document = text if isinstance(text, Document) else Document.from_text(text)
+        if not document.sections:
+            return None
+        return self._pack(self._document_sentences(document), chunk_budget)
+
+    def _reduce_length(self, max_len, reduce_budget):
+        """Summary cap of reduce rounds: a third of a group, so groups merge several summaries"""
+        return max(min(max_len, reduce_budget // 3), self.MIN_REDUCE_LENGTH)
+
+    def _reduce_round(self, summaries, previous, gap_budget, reduce_budget, reduce_len):
+        """
+        Plan the next reduce round for {doc: partial summaries}; previous maps
+        each document to the tokens fed to the round that produced them. A
+        document is done once it fits the knowledge-gap window, or when the
+        round could not shrink it. If the last round did not shrink a
+        document, the summary cap is halved and the document tried again;
+        at MIN_REDUCE_LENGTH it stops reducing.
+        Returns ({doc: groups}, {doc: combined text}, {doc: tokens}, reduce_len).
+        """
+        totals = {doc: sum(self.count_tokens(parts)) for doc, parts in summaries.items()}
+        stalled = {doc for doc, total in totals.items() if doc in previous and total >= previous[doc]}
+        if stalled and reduce_len > self.MIN_REDUCE_LENGTH:
+            reduce_len = max(reduce_len // 2, self.MIN_REDUCE_LENGTH)
+            stalled = set()
+
+        level, combined = {}, {}
+        for doc, parts in summaries.items():
+            groups = None
+            if doc not in stalled and len(parts) > 1 and totals[doc] > gap_budget:
+                groups = self._pack(parts, reduce_budget)
+                if len(groups) * reduce_len >= totals[doc]:  # the groups could emit as much as they take in
+                    groups = None
+            if groups is None:
+                combined[doc] = " ".join(parts)
+            else:
+                level[doc] = groups
+        return level, combined, totals, reduce_len
+
+    def _format_summary(self, combined, knowledge_gaps):
+        if not knowledge_gaps:
+            print("[WARN] Knowledge gap generation failed")
+            knowledge_gaps = "Could not generate knowledge gaps due to memory constraints."
         return (
-            f"### Methodology, Methods & Results Summary\n{combined_summary}\n\n"
+            f"### Methodology, Methods & Results Summary\n{combined}\n\n"
             f"### Knowledge Gaps & Future Directions\n{knowledge_gaps}"
         )
+
+    def summarize(self, text, max_len: int = 250, min_len: int = 80) -> str:
+        """text is a plain string or a services.document.Document"""
+        return self.summarize_many([text], max_len=max_len, min_len=min_len)[0]
+
+    def summarize_many(self, texts, max_len: int = 250, min_len: int = 80):
+        """
+        Summarize several documents together as a map-reduce tree: every chunk
+        of every document goes through one batched pass, then each level's
+        groups of partial summaries through one more, until each document's
+        summary fits the knowledge-gap prompt's window. All knowledge-gap
+        prompts share a final pass. Each item of texts is a string or a Document.
+        """
+        chunk_budget = self.token_budget(self.INSTRUCTIONS)
+        reduce_budget = self.token_budget(self.REDUCE_INSTRUCTIONS)
+        gap_budget = self.token_budget(self.KNOWLEDGE_GAP_PROMPT)
+
+        # Map: the chunks of all documents; later levels reduce groups of summaries
+        level = {}
+        for doc, text in enumerate(texts):
+            parts = self._map_parts(text, chunk_budget)
+            if parts:
+                level[doc] = parts
+        reduce_len = self._reduce_length(max_len, reduce_budget)
+        prompt, length, combined, previous = self.INSTRUCTIONS, max_len, {}, {}
+        while level:
+            inputs = [(doc, prompt + "\n" + part) for doc, parts in level.items() for part in parts]
+            results = self._generate_cached([text for _, text in inputs], max_length=length,
+                                            min_length=min(min_len, length // 2))
+            summaries = {doc: [] for doc in level}
+            for (doc, _), summary in zip(inputs, results):
+                if summary:
+                    summaries[doc].append(summary)
+
+            level, done, previous, reduce_len = self._reduce_round(
+                summaries, previous, gap_budget, reduce_budget, reduce_len)
+            combined.update(done)
+            prompt, length = self.REDUCE_INSTRUCTIONS, reduce_len
+
+        # Knowledge gaps
+        gap_docs = list(combined)
+        gap_results = self._generate(
+            [self.KNOWLEDGE_GAP_PROMPT + "\n" + combined[doc] for doc in gap_docs],
+            max_length=200,
+            min_length=80
+        )
+        gaps = dict(zip(gap_docs, gap_results))
+
+        return [
+            self._format_summary(combined[doc], gaps.get(doc)) if doc in combined
+            else "No text available for summarization."
+            for doc in range(len(texts))
+        ]
+
+    def summarize_stream(self, text, max_len: int = 250, min_len: int = 80):
+        """
+        Generator version of summarize() for one document. Chunks go through
+        the model batch_size at a time and every result is yielded as soon as
+        its batch finishes:
+          {"event": "chunks", "total": M}
+          {"event": "chunk", "index": N, "total": M, "summary": ...}   (N = 1..M)
+          {"event": "reduce", "level": L, "groups": K}                  (long papers only)
+          {"event": "knowledge_gaps", "text": ...}
+          {"event": "summary", "summary": <same text summarize() returns>}
+        """
+        chunk_budget = self.token_budget(self.INSTRUCTIONS)
+        reduce_budget = self.token_budget(self.REDUCE_INSTRUCTIONS)
+        gap_budget = self.token_budget(self.KNOWLEDGE_GAP_PROMPT)
+
+        parts = self._map_parts(text, chunk_budget)
+        if not parts:
+            yield {"event": "summary", "summary": "No text available for summarization."}
+            return
+        yield {"event": "chunks", "total": len(parts)}
+
+        reduce_len = self._reduce_length(max_len, reduce_budget)
+        prompt, length, previous, depth = self.INSTRUCTIONS, max_len, {}, 0
+        while True:
+            summaries = []
+            for start in range(0, len(parts), self.batch_size):
+                batch = [prompt + "\n" + part for part in parts[start:start + self.batch_size]]
+                results = self._generate_cached(batch, max_length=length, min_length=min(min_len, length // 2))
+                for offset, summary in enumerate(results):
+                    if depth == 0:
+                        yield {"event": "chunk", "index": start + offset + 1, "total": len(parts), "summary": summary}
+                    if summary:
+                        summaries.append(summary)
+
+            level, done, previous, reduce_len = self._reduce_round(
+                {0: summaries}, previous, gap_budget, reduce_budget, reduce_len)
+            if not level:
+                combined = done[0]
+                break
+            depth += 1
+            yield {"event": "reduce", "level": depth, "groups": len(level[0])}
+            parts, prompt, length = level[0], self.REDUCE_INSTRUCTIONS, reduce_len
+
+        knowledge_gaps = self._generate(
+            [self.KNOWLEDGE_GAP_PROMPT + "\n" + combined], max_length=200, min_length=80
+        )[0]
+        yield {"event": "knowledge_gaps", "text": knowledge_gaps}
+        yield {"event": "summary", "summary": self._format_summary(combined, knowledge_gaps)}
@@ -0,0 +1,150 @@
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from queue import Queue, Empty
+
+from services.metrics import STAGE_SECONDS
+
+
+class ThroughputStats:
+    def __init__(self):
+        """Thread-safe counters for batched inference (items, batches, busy seconds)"""
+        self._lock = threading.Lock()
+        self.items = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def record(self, items, seconds):
+        with self._lock:
+            self.items += items
+            self.batches += 1
+            self.seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "chunks": self.items,
+                "batches": self.batches,
+                "busy_seconds": round(self.seconds, 3),
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "chunks_per_sec": round(self.items / self.seconds, 3) if self.seconds else 0.0,
+            }
+
+
+class InferenceSlots:
+    def __init__(self, slots=0):
+        """
+        Caps concurrent summarizer calls in this process (0 = unlimited), so
+        several request threads in one worker queue for the model instead of
+        oversubscribing the CPU cores the worker's torch threads are pinned to
+        """
+        self.configure(slots)
+
+    def configure(self, slots):
+        """(Re)size the slots; serving workers call this after fork"""
+        self.slots = slots
+        self._semaphore = threading.BoundedSemaphore(slots) if slots else None
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+
+    @contextmanager
+    def hold(self):
+        semaphore = self._semaphore
+        if semaphore is None:
+            yield
+            return
+        with self._lock:
+            self.waiting += 1
+        start = time.perf_counter()
+        semaphore.acquire()
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="inference_wait")
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            semaphore.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {"slots": self.slots, "in_use": self.in_use, "waiting": self.waiting}
+
+
+# One per process: summarizer calls in this process share it
+inference_slots = InferenceSlots()
+
+
+class MicroBatcher:
+    def __init__(self, max_batch_size=16, max_wait_ms=20):
+        """
+        Cross-request micro-batching for summarization pipelines.
+        Requests arriving within max_wait_ms of each other that target the same
+        pipeline with the same generation kwargs are merged into shared forward
+        passes of up to max_batch_size inputs. A single daemon thread owns all
+        model calls, so concurrent Flask requests never contend on the model.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = ThroughputStats()
+        self._queue = Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._start_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                    self._worker.start()
+
+    def submit(self, pipeline, inputs, **gen_kwargs):
+        """Queue inputs for `pipeline` and block until their outputs are ready"""
+        if not inputs:
+            return []
+        self._ensure_worker()
+        key = (id(pipeline), tuple(sorted(gen_kwargs.items())))
+        futures = []
+        for text in inputs:
+            future = Future()
+            self._queue.put((key, pipeline, text, gen_kwargs, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+
+            groups = {}
+            for item in pending:
+                groups.setdefault(item[0], []).append(item)
+            for items in groups.values():
+                for start in range(0, len(items), self.max_batch_size):
+                    self._run_batch(items[start:start + self.max_batch_size])
+
+    def _run_batch(self, items):
+        _, pipeline, _, gen_kwargs, _ = items[0]
+        texts = [item[2] for item in items]
+        start = time.perf_counter()
+        try:
+            outputs = pipeline(texts, batch_size=len(texts), **gen_kwargs)
+        except Exception as e:
+            for item in items:
+                item[4].set_exception(e)
+            return
+        self.stats.record(len(texts), time.perf_counter() - start)
+        for item, output in zip(items, outputs):
+            item[4].set_result(output)
@@ -0,0 +1,319 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from services.lru_cache import LRUCache
+from services.metrics import STAGE_SECONDS, record_cache
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT PRIMARY KEY,
+    kind     TEXT NOT NULL,
+    value    BLOB,
+    paths    TEXT,
+    size     INTEGER NOT NULL DEFAULT 0,
+    tag      TEXT,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL,
+    expires  REAL
+);
+CREATE INDEX IF NOT EXISTS entries_kind_accessed ON entries (kind, accessed);
+CREATE INDEX IF NOT EXISTS entries_tag ON entries (kind, tag);
+"""
+
+
+class CacheStore:
+    def __init__(self, db_path="data/cache/cache.db", ttl_seconds=None, budgets=None,
+                 hot_items=256, hot_ttl=300, touch_interval=60, evict_every=50):
+        """
+        One cache for analyses, downloaded/uploaded PDFs and extracted text:
+        - SQLite (WAL) index of every entry: kind, size, last access, expiry
+        - JSON values (analyses) live in the database; files (PDFs, text
+          artifacts) stay on disk and are registered by path
+        - expired entries are dropped on read and during eviction
+        - per-kind byte budgets evict least-recently-used entries (and their files)
+        - a bounded in-process LRU hot tier sits in front of SQLite; its hits
+          are written back to `accessed` in batches, so LRU eviction sees them
+        """
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.budgets = budgets or {}
+        self.touch_interval = touch_interval
+        self.evict_every = evict_every
+
+        self.hot = LRUCache(maxsize=hot_items, ttl=hot_ttl)
+        self._listeners = []  # (key prefix, callback(key, value)) run after put_json
+        self._local = threading.local()
+        self._puts = 0
+        self._touched = {}  # key -> last hot-tier hit not yet written to SQLite
+        self._touch_flushed = time.time()
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, cache_dir=None):
+        """Store under cache_dir (default Config.CACHE_DIR) with the configured TTL and budgets"""
+        mb = 1024 * 1024
+        return cls(
+            Path(cache_dir or Config.CACHE_DIR) / "cache.db",
+            ttl_seconds=Config.CACHE_EXPIRY_HOURS * 3600,
+            budgets={
+                "pdf": Config.CACHE_MAX_PDF_MB * mb,
+                "text": Config.CACHE_MAX_TEXT_MB * mb,
+                "analysis": Config.CACHE_MAX_ANALYSIS_MB * mb,
+                "chunk": Config.CACHE_MAX_CHUNK_MB * mb,
+            },
+            hot_items=Config.CACHE_HOT_ITEMS
+        )
+
+    # -------------------------------
+    # Connection
+    # -------------------------------
+    def _conn(self):
+        """One connection per thread (and per process after fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expiry(self, ttl):
+        ttl = self.ttl_seconds if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    def _touch(self, key, accessed):
+        now = time.time()
+        if now - accessed >= self.touch_interval:  # throttle writes on hot reads
+            self._conn().execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+
+    def _touch_hot(self, key):
+        """Remember a hot-tier hit; flushed every evict_every hits or touch_interval seconds"""
+        now = time.time()
+        with self._lock:
+            self._touched[key] = now
+            due = len(self._touched) >= self.evict_every or now - self._touch_flushed >= self.touch_interval
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """Write pending hot-tier access times to SQLite"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touch_flushed = time.time()
+        if touched:
+            self._conn().executemany(
+                "UPDATE entries SET accessed = ? WHERE key = ? AND accessed < ?",
+                [(accessed, key, accessed) for key, accessed in touched.items()]
+            )
+
+    # -------------------------------
+    # JSON values
+    # -------------------------------
+    def get_json(self, key, hot=True):
+        """Value of key, or None; hot=False reads SQLite only and keeps the value out of the hot tier"""
+        with STAGE_SECONDS.time(stage="cache_lookup"):
+            value = self._get_json(key, hot)
+        record_cache(key.split(":", 1)[0], value is not None)
+        return value
+
+    def _get_json(self, key, use_hot=True):
+        hot = self.hot.get(key) if use_hot else None
+        if hot is not None:
+            expires, value = hot
+            if expires is None or expires > time.time():
+                self._touch_hot(key)
+                return value
+            self.hot.pop(key)
+
+        row = self._conn().execute(
+            "SELECT value, accessed, expires FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        value, accessed, expires = row
+        if expires is not None and expires <= time.time():
+            self.delete(key)
+            return None
+
+        self._touch(key, accessed)
+        value = json.loads(value)
+        if use_hot:
+            self.hot.put(key, (expires, value))
+        return value
+
+    def put_json(self, key, value, kind="analysis", ttl=None, hot=True):
+        """Store a JSON value; hot=False for bulk entries that should not displace hot-tier ones"""
+        data = json.dumps(value).encode("utf-8")
+        now, expires = time.time(), self._expiry(ttl)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries (key, kind, value, paths, size, tag, created, accessed, expires) "
+            "VALUES (?, ?, ?, NULL, ?, NULL, ?, ?, ?)",
+            (key, kind, data, len(data), now, now, expires)
+        )
+        if hot:
+            self.hot.put(key, (expires, value))
+        else:
+            self.hot.pop(key)
+        self._maybe_evict()
+        self._notify(key, value)
+
+    def subscribe(self, prefix, callback):
+        """Call callback(key, value) after every put_json whose key starts with prefix"""
+        self._listeners.append((prefix, callback))
+
+    def replay(self, prefix, since):
+        """
+        Run the listeners for entries under prefix written after since, by
+        this or another process sharing the database (listeners must be
+        idempotent). Returns the newest created time seen, or since.
+        """
+        latest = since
+        for key, value, created in self.changes_json(prefix, since):
+            self._notify(key, value)
+            latest = max(latest, created)
+        return latest
+
+    def _notify(self, key, value):
+        for prefix, callback in self._listeners:
+            if key.startswith(prefix):
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    print(f"[WARN] Cache listener for {prefix!r} failed: {e}")
+
+    def scan_json(self, prefix):
+        """(key, value) for every unexpired JSON entry whose key starts with prefix, without touching them"""
+        rows = self._conn().execute(
+            "SELECT key, value FROM entries WHERE key LIKE ? AND value IS NOT NULL "
+            "AND (expires IS NULL OR expires > ?) ORDER BY key",
+            (prefix + "%", time.time())
+        ).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def changes_json(self, prefix, since):
+        """(key, value, created) for unexpired JSON entries under prefix written after since, oldest first"""
+        rows = self._conn().execute(
+            "SELECT key, value, created FROM entries WHERE key LIKE ? AND value IS NOT NULL AND created > ? "
+            "AND (expires IS NULL OR expires > ?) ORDER BY created",
+            (prefix + "%", since, time.time())
+        ).fetchall()
+        for key, value, created in rows:
+            yield key, json.loads(value), created
+
+    # -------------------------------
+    # Files
+    # -------------------------------
+    def put_file(self, key, paths, kind="pdf", tag=None, ttl=None):
+        """Register files on disk (e.g. a PDF and its sidecar) under one key"""
+        paths = [Path(p) for p in paths]
+        size = sum(p.stat().st_size for p in paths if p.exists())
+        now, expires = time.time(), self._expiry(ttl)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries (key, kind, value, paths, size, tag, created, accessed, expires) "
+            "VALUES (?, ?, NULL, ?, ?, ?, ?, ?, ?)",
+            (key, kind, json.dumps([str(p) for p in paths]), size, tag, now, now, expires)
+        )
+        self._maybe_evict(force=True)
+
+    def get_file(self, key):
+        """Path of the first registered file, or None if unknown, expired or gone from disk"""
+        with STAGE_SECONDS.time(stage="cache_lookup"):
+            path = self._get_file(key)
+        record_cache(key.split(":", 1)[0], path is not None)
+        return path
+
+    def _get_file(self, key):
+        row = self._conn().execute(
+            "SELECT paths, accessed, expires FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        paths, accessed, expires = json.loads(row[0]), row[1], row[2]
+        if (expires is not None and expires <= time.time()) or not Path(paths[0]).exists():
+            self.delete(key)
+            return None
+        self._touch(key, accessed)
+        return Path(paths[0])
+
+    def find_by_tag(self, kind, tag, prefix=""):
+        """Key (starting with prefix) of an entry of this kind carrying tag, e.g. a PDF's sha256"""
+        row = self._conn().execute(
+            "SELECT key FROM entries WHERE kind = ? AND tag = ? AND key LIKE ? LIMIT 1",
+            (kind, tag, prefix + "%")
+        ).fetchone()
+        return row[0] if row else None
+
+    def has(self, key):
+        return self._conn().execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    # -------------------------------
+    # Removal / eviction
+    # -------------------------------
+    def delete(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT paths FROM entries WHERE key = ?", (key,)).fetchone()
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.hot.pop(key)
+        if row and row[0]:
+            for path in json.loads(row[0]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _maybe_evict(self, force=False):
+        with self._lock:
+            self._puts += 1
+            if not force and self._puts % self.evict_every:
+                return
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then LRU entries of any kind over its byte budget"""
+        self.flush_touches()
+        conn = self._conn()
+        removed = 0
+        expired = conn.execute(
+            "SELECT key FROM entries WHERE expires IS NOT NULL AND expires <= ?", (time.time(),)
+        ).fetchall()
+        for (key,) in expired:
+            self.delete(key)
+            removed += 1
+
+        for kind, budget in self.budgets.items():
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE kind = ?", (kind,)).fetchone()[0]
+            if total <= budget:
+                continue
+            for key, size in conn.execute(
+                "SELECT key, size FROM entries WHERE kind = ? ORDER BY accessed ASC", (kind,)
+            ).fetchall():
+                if total <= budget:
+                    break
+                self.delete(key)
+                total -= size
+                removed += 1
+        return removed
+
+    def stats(self):
+        rows = self._conn().execute(
+            "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY kind"
+        ).fetchall()
+        return {
+            "kinds": {
+                kind: {"entries": count, "bytes": size, "budget": self.budgets.get(kind)}
+                for kind, count, size in rows
+            },
+            "hot_tier": self.hot.stats(),
+            "ttl_seconds": self.ttl_seconds,
+        }
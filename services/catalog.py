@@ -0,0 +1,236 @@
+"""
+Publication catalog compiled from the CSV into one binary snapshot.
+
+The snapshot is a single file: a JSON header followed by 8-byte aligned numpy
+arrays, which are memory-mapped on load, so startup cost does not depend on
+catalog size. String columns are stored as one UTF-8 blob plus an int64
+offsets array. PMCIDs are parsed out of `Link` at build time and kept as
+integers, with a sorted PMCID -> row index next to them.
+
+    python -m services.catalog                 # (re)build data/cache/catalog.bin
+    python -m services.catalog --csv other.csv --out /tmp/catalog.bin
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import struct
+import sys
+import unicodedata
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from services.text_store import file_sha256
+
+MAGIC = b"NBCAT1\n\0"
+FORMAT_VERSION = 1
+ALIGN = 8
+
+PMCID_RE = re.compile(r"PMC(\d+)", re.IGNORECASE)
+
+
+def parse_pmcid(link):
+    """'https://www.ncbi.nlm.nih.gov/pmc/articles/PMC4136787/' -> 'PMC4136787' (None if absent)"""
+    match = PMCID_RE.search(link or "")
+    return f"PMC{match.group(1)}" if match else None
+
+
+def normalize_title(title):
+    """Unicode-normalize (NFKC) and collapse whitespace"""
+    return " ".join(unicodedata.normalize("NFKC", title or "").split())
+
+
+def _pack_strings(values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class Catalog:
+    COLUMNS = ("Title", "Link", "PMCID")
+
+    def __init__(self, arrays, source=None):
+        """
+        Columns over `arrays` (in-memory or memory-mapped):
+        title_blob/title_off, link_blob/link_off, pmcid (int64, -1 = none),
+        pmcid_sorted/pmcid_rows (PMCID -> row index)
+        """
+        self.arrays = arrays
+        self.source = source or {}
+        self._titles = None
+
+    # -------------------------------
+    # Build / persist
+    # -------------------------------
+    @classmethod
+    def from_records(cls, titles, links, source=None):
+        titles = [normalize_title(t) for t in titles]
+        links = [(link or "").strip() for link in links]
+        pmcid = np.array([int(p[3:]) if p else -1 for p in map(parse_pmcid, links)], dtype=np.int64)
+
+        title_blob, title_off = _pack_strings(titles)
+        link_blob, link_off = _pack_strings(links)
+        order = np.argsort(pmcid, kind="stable")  # stable: duplicate PMCIDs resolve to the first row
+        order = order[pmcid[order] >= 0]
+        return cls({
+            "title_blob": title_blob, "title_off": title_off,
+            "link_blob": link_blob, "link_off": link_off,
+            "pmcid": pmcid,
+            "pmcid_sorted": pmcid[order], "pmcid_rows": order.astype(np.int64),
+        }, source)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        csv_path = Path(csv_path)
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+        stat = csv_path.stat()
+        source = {"path": str(csv_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                  "sha256": file_sha256(csv_path)}
+        return cls.from_records([r.get("Title", "") for r in rows], [r.get("Link", "") for r in rows], source)
+
+    def save(self, path):
+        """Write the snapshot atomically (temp file + rename)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        layout, offset = {}, 0
+        for name, array in self.arrays.items():
+            offset = -(-offset // ALIGN) * ALIGN
+            layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += array.nbytes
+        header = json.dumps({
+            "version": FORMAT_VERSION, "rows": len(self), "source": self.source, "arrays": layout
+        }).encode("utf-8")
+        data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, array in self.arrays.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def read_header(path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a catalog snapshot")
+            (length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length))
+        header["data_start"] = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+        return header
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a snapshot; columns are paged in on first access"""
+        header = cls.read_header(path)
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported catalog version {header.get('version')}")
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            shape = tuple(spec["shape"])
+            if not np.prod(shape):
+                arrays[name] = np.zeros(shape, dtype=spec["dtype"])  # empty arrays cannot be mapped
+                continue
+            arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r",
+                                     offset=header["data_start"] + spec["offset"], shape=shape)
+        return cls(arrays, header.get("source"))
+
+    # -------------------------------
+    # Access
+    # -------------------------------
+    def __len__(self):
+        return len(self.arrays["pmcid"])
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def _string(self, column, pos):
+        off = self.arrays[f"{column}_off"]
+        return bytes(self.arrays[f"{column}_blob"][off[pos]:off[pos + 1]]).decode("utf-8")
+
+    def title(self, pos):
+        return self._string("title", pos)
+
+    def link(self, pos):
+        return self._string("link", pos)
+
+    def pmcid(self, pos):
+        value = int(self.arrays["pmcid"][pos])
+        return f"PMC{value}" if value >= 0 else None
+
+    @property
+    def titles(self):
+        """All titles, decoded once (the search indexes are built from these)"""
+        if self._titles is None:
+            blob = bytes(self.arrays["title_blob"])
+            off = self.arrays["title_off"].tolist()
+            self._titles = [blob[off[i]:off[i + 1]].decode("utf-8") for i in range(len(self))]
+        return self._titles
+
+    def record(self, pos):
+        """{'Title', 'Link', 'PMCID'} for row position pos"""
+        if not 0 <= pos < len(self):
+            raise IndexError(pos)
+        return {"Title": self.title(pos), "Link": self.link(pos), "PMCID": self.pmcid(pos)}
+
+    def row_for_pmcid(self, pmcid):
+        """Row of the first publication with this PMCID, or None"""
+        match = PMCID_RE.fullmatch(str(pmcid).strip())
+        if not match:
+            return None
+        value = int(match.group(1))
+        keys = self.arrays["pmcid_sorted"]
+        i = int(np.searchsorted(keys, value))
+        if i < len(keys) and keys[i] == value:
+            return int(self.arrays["pmcid_rows"][i])
+        return None
+
+
+def load_catalog(csv_path, snapshot_path):
+    """
+    Load the snapshot, rebuilding it first when it is missing, unreadable or
+    was built from a different CSV (size/mtime, then content hash).
+    """
+    csv_path, snapshot_path = Path(csv_path), Path(snapshot_path)
+    try:
+        source = Catalog.read_header(snapshot_path).get("source", {})
+        stat = csv_path.stat()
+        if (source.get("size"), source.get("mtime_ns")) == (stat.st_size, stat.st_mtime_ns) \
+                or source.get("sha256") == file_sha256(csv_path):
+            return Catalog.load(snapshot_path)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    catalog = Catalog.from_csv(csv_path)
+    catalog.save(snapshot_path)
+    print(f"Built catalog snapshot {snapshot_path} ({len(catalog)} rows)")
+    return Catalog.load(snapshot_path)
+
+
+def main(argv=None):
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Compile the publication CSV into a binary catalog snapshot")
+    parser.add_argument("--csv", default=str(Config.CSV_FILE))
+    parser.add_argument("--out", default=str(Config.CATALOG_FILE))
+    args = parser.parse_args(argv)
+
+    catalog = Catalog.from_csv(args.csv)
+    catalog.save(args.out)
+    missing = int((catalog.arrays["pmcid"] < 0).sum())
+    print(f"Wrote {args.out}: {len(catalog)} rows, {len(catalog) - missing} with a PMCID")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import re
+
+# BioC section_type labels; PDF headings are mapped onto the same set
+HEADINGS = {
+    "abstract": "ABSTRACT",
+    "summary": "ABSTRACT",
+    "introduction": "INTRO",
+    "background": "INTRO",
+    "methods": "METHODS",
+    "method": "METHODS",
+    "materials and methods": "METHODS",
+    "material and methods": "METHODS",
+    "methods and materials": "METHODS",
+    "methodology": "METHODS",
+    "experimental": "METHODS",
+    "experimental procedures": "METHODS",
+    "experimental section": "METHODS",
+    "study design": "METHODS",
+    "results": "RESULTS",
+    "results and discussion": "RESULTS",
+    "discussion": "DISCUSS",
+    "conclusion": "CONCL",
+    "conclusions": "CONCL",
+    "concluding remarks": "CONCL",
+    "summary and conclusions": "CONCL",
+    "references": "REF",
+    "bibliography": "REF",
+    "literature cited": "REF",
+    "works cited": "REF",
+    "acknowledgments": "ACK_FUND",
+    "acknowledgements": "ACK_FUND",
+    "acknowledgment": "ACK_FUND",
+    "acknowledgement": "ACK_FUND",
+    "funding": "ACK_FUND",
+    "author contributions": "AUTH_CONT",
+    "conflict of interest": "COMP_INT",
+    "conflicts of interest": "COMP_INT",
+    "competing interests": "COMP_INT",
+    "declaration of competing interest": "COMP_INT",
+    "supplementary material": "SUPPL",
+    "supplementary materials": "SUPPL",
+    "supplementary information": "SUPPL",
+    "supporting information": "SUPPL",
+    "abbreviations": "ABBR",
+}
+
+# Optional numbering ("2.", "3.1", "IV."), then a short heading on a line of its own
+HEADING_RE = re.compile(r"^(?:(?:\d+(?:\.\d+)*|[IVX]+)[.)]?\s+)?([A-Za-z][A-Za-z &,/-]{2,60}?)\s*[:.]?$")
+
+FRONT = "FRONT"      # text before the first detected heading (title, authors, often the abstract)
+UNKNOWN = "UNKNOWN"  # no structure found
+BODY_KINDS = {"ABSTRACT", "INTRO", "METHODS", "RESULTS", "DISCUSS", "CONCL"}
+
+
+def heading_kind(line):
+    """Section type for a heading line, or None if the line is not a known heading"""
+    match = HEADING_RE.match(line.strip())
+    if not match:
+        return None
+    name = " ".join(match.group(1).lower().replace("&", " and ").split())
+    return HEADINGS.get(name)
+
+
+class Section:
+    def __init__(self, kind, text, title=None):
+        self.kind = kind
+        self.text = text
+        self.title = title
+
+    def to_dict(self):
+        return {"kind": self.kind, "title": self.title, "text": self.text}
+
+
+class Document:
+    def __init__(self, sections):
+        """Paper text as an ordered list of labelled sections"""
+        self.sections = [s for s in sections if s.text.strip()]
+
+    @property
+    def text(self):
+        """Flattened text of every section (what gets stored and indexed)"""
+        return "\n".join(s.text for s in self.sections).strip()
+
+    def kinds(self):
+        return [s.kind for s in self.sections]
+
+    def to_dict(self):
+        return {"sections": [s.to_dict() for s in self.sections]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([Section(s["kind"], s["text"], s.get("title")) for s in data.get("sections", [])])
+
+    @classmethod
+    def from_bioc(cls, data):
+        """
+        Group consecutive BioC passages sharing a section_type infon into one
+        section; title_* passages become the section's title.
+        """
+        sections = []
+        for doc in data.get("documents", []):
+            for passage in doc.get("passages", []):
+                text = passage.get("text")
+                if not text:
+                    continue
+                infons = passage.get("infons", {})
+                kind = (infons.get("section_type") or UNKNOWN).upper()
+                is_heading = infons.get("type", "").startswith("title")
+                if not sections or sections[-1].kind != kind:
+                    sections.append(Section(kind, "", text if is_heading else None))
+                section = sections[-1]
+                section.text = f"{section.text}\n{text}" if section.text else text
+        return cls(sections)
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Split extracted PDF text at lines that look like standard paper
+        headings. When no body heading (intro, methods, ...) is found, the
+        text before the first heading is the body and is labelled UNKNOWN.
+        """
+        sections, kind, title, lines = [], FRONT, None, []
+        for line in (text or "").splitlines():
+            found = heading_kind(line)
+            if found is None:
+                lines.append(line)
+                continue
+            sections.append(Section(kind, "\n".join(lines).strip(), title))
+            kind, title, lines = found, line.strip(), []
+        sections.append(Section(kind, "\n".join(lines).strip(), title))
+
+        if not any(s.kind in BODY_KINDS for s in sections):
+            sections = [Section(UNKNOWN, s.text, s.title) if s.kind == FRONT else s for s in sections]
+        return cls(sections)
@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from math import log
+from pathlib import Path
+
+import numpy as np
+
+from services.search_index import analyze, top_k
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+
+class FullTextIndex:
+    def __init__(self, index_dir="data/cache/fulltext", analyzer=analyze,
+                 k1=1.2, b=0.75, max_segments=8, merge_factor=4):
+        """
+        Persistent, segmented full-text index over extracted paper bodies.
+        - Every add_document() writes a small immutable segment:
+          <seg>.lex.json  (term -> [offset, count], doc ids and lengths)
+          <seg>.post      (int32 (doc_id, tf) pairs, opened with np.memmap)
+        - manifest.json lists live segments and is replaced atomically
+        - Only lexicons are read on load; postings stay on disk until queried
+        - Re-indexing a document shadows its postings in older segments
+        - When segments exceed max_segments the smallest are merged
+        """
+        self.index_dir = Path(index_dir)
+        self.analyzer = analyzer
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+
+        self._lock = threading.RLock()
+        self._segments = None  # name -> segment dict, loaded lazily
+        self._order = []
+        self._manifest_mtime = None
+
+    # -------------------------------
+    # Paths / locking
+    # -------------------------------
+    @property
+    def manifest_path(self):
+        return self.index_dir / "manifest.json"
+
+    def _lex_path(self, name):
+        return self.index_dir / f"{name}.lex.json"
+
+    def _post_path(self, name):
+        return self.index_dir / f"{name}.post"
+
+    def _file_lock(self):
+        """Cross-process lock around manifest updates (no-op without fcntl)"""
+        index_dir = self.index_dir
+
+        class _FileLock:
+            def __enter__(self):
+                index_dir.mkdir(parents=True, exist_ok=True)
+                self.handle = open(index_dir / ".lock", "a+")
+                if fcntl:
+                    fcntl.flock(self.handle, fcntl.LOCK_EX)
+                return self
+
+            def __exit__(self, *exc):
+                if fcntl:
+                    fcntl.flock(self.handle, fcntl.LOCK_UN)
+                self.handle.close()
+
+        return _FileLock()
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # -------------------------------
+    # Loading
+    # -------------------------------
+    def _read_manifest(self):
+        if not self.manifest_path.exists():
+            return []
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("segments", [])
+
+    def _open_segment(self, name):
+        with open(self._lex_path(name), "r", encoding="utf-8") as f:
+            lex = json.load(f)
+        return {
+            "name": name,
+            "terms": lex["terms"],
+            "docs": dict(zip(lex["docs"], lex["doc_lengths"])),
+            "postings": None,  # memmapped on first access
+        }
+
+    def _postings(self, segment):
+        if segment["postings"] is None:
+            path = self._post_path(segment["name"])
+            if path.stat().st_size == 0:
+                segment["postings"] = np.zeros((0, 2), dtype=np.int32)
+            else:
+                segment["postings"] = np.memmap(path, dtype=np.int32, mode="r").reshape(-1, 2)
+        return segment["postings"]
+
+    def _ensure_loaded(self):
+        """(Re)load lexicons when the manifest changed on disk, e.g. written by another process"""
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if self._segments is not None and mtime == self._manifest_mtime:
+            return
+
+        old = self._segments or {}
+        segments = {}
+        order = self._read_manifest()
+        for name in order:
+            segments[name] = old.get(name) or self._open_segment(name)
+
+        # Newest segment wins for documents indexed more than once
+        owner, doc_lengths = {}, {}
+        for name in order:
+            for doc_id, length in segments[name]["docs"].items():
+                owner[doc_id] = name
+                doc_lengths[doc_id] = length
+
+        self._segments = segments
+        self._order = order
+        self._owner = owner
+        self._doc_lengths = doc_lengths
+        self._avg_doc_length = (sum(doc_lengths.values()) / len(doc_lengths)) if doc_lengths else 0.0
+        self._manifest_mtime = mtime
+
+    @property
+    def version(self):
+        """Changes whenever documents are added or segments merged (any process)"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._manifest_mtime
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._doc_lengths)
+
+    def __contains__(self, doc_id):
+        with self._lock:
+            self._ensure_loaded()
+            return str(doc_id) in self._owner
+
+    # -------------------------------
+    # Writing
+    # -------------------------------
+    def _write_segment(self, docs):
+        """docs: list of (doc_id, Counter of term frequencies); returns segment name"""
+        name = f"seg_{uuid.uuid4().hex[:12]}"
+        postings = {}
+        doc_ids, doc_lengths = [], []
+        for doc_id, counts in docs:
+            doc_ids.append(str(doc_id))
+            doc_lengths.append(int(sum(counts.values())))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((int(doc_id), int(tf)))
+
+        terms, flat, offset = {}, [], 0
+        for term in sorted(postings):
+            pairs = postings[term]
+            terms[term] = [offset, len(pairs)]
+            flat.extend(pairs)
+            offset += len(pairs)
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(self._post_path(name), np.asarray(flat, dtype=np.int32).reshape(-1, 2).tobytes())
+        lex = {"terms": terms, "docs": doc_ids, "doc_lengths": doc_lengths}
+        self._write_atomic(self._lex_path(name), json.dumps(lex).encode("utf-8"))
+        return name
+
+    def _save_manifest(self, order):
+        self._write_atomic(self.manifest_path, json.dumps({"segments": order}).encode("utf-8"))
+
+    def add_document(self, doc_id, text):
+        """Index (or re-index) one document body as a new segment"""
+        counts = Counter(self.analyzer(text or ""))
+        with self._lock, self._file_lock():
+            name = self._write_segment([(doc_id, counts)])
+            self._manifest_mtime = None  # force a reload of the manifest under the lock
+            order = self._read_manifest() + [name]
+            self._save_manifest(order)
+            self._ensure_loaded()
+            if len(self._order) > self.max_segments:
+                self._merge_smallest()
+
+    def _merge_smallest(self):
+        """Merge the merge_factor smallest segments into one (caller holds both locks)"""
+        by_size = sorted(self._order, key=lambda n: len(self._segments[n]["docs"]))
+        victims = set(by_size[:self.merge_factor])
+
+        docs = []
+        for name in self._order:
+            if name not in victims:
+                continue
+            segment = self._segments[name]
+            postings = self._postings(segment)
+            live = {doc_id for doc_id in segment["docs"] if self._owner.get(doc_id) == name}
+            counts = {doc_id: Counter() for doc_id in live}
+            for term, (offset, count) in segment["terms"].items():
+                for doc_id, tf in postings[offset:offset + count]:
+                    key = str(int(doc_id))
+                    if key in counts:
+                        counts[key][term] = int(tf)
+            docs.extend((int(doc_id), c) for doc_id, c in counts.items())
+
+        merged = self._write_segment(docs)
+        # Keep the merged segment at the position of the newest victim so shadowing still holds
+        order, inserted = [], False
+        newest = [n for n in self._order if n in victims][-1]
+        for name in self._order:
+            if name == newest:
+                order.append(merged)
+                inserted = True
+            elif name not in victims:
+                order.append(name)
+        if not inserted:
+            order.append(merged)
+
+        self._save_manifest(order)
+        for name in victims:
+            segment = self._segments.pop(name)
+            segment["postings"] = None
+            for path in (self._lex_path(name), self._post_path(name)):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # still mapped elsewhere (Windows); harmless leftover
+        self._manifest_mtime = None
+        self._ensure_loaded()
+
+    # -------------------------------
+    # Querying
+    # -------------------------------
+    def score(self, terms):
+        """Return {doc_id: bm25 score} for documents whose body matches any term"""
+        with self._lock:
+            self._ensure_loaded()
+            n = len(self._doc_lengths)
+            if not n:
+                return {}
+
+            k1, b, avgdl = self.k1, self.b, self._avg_doc_length or 1.0
+            scores = {}
+            for term in set(terms):
+                hits = []
+                for name in self._order:
+                    segment = self._segments[name]
+                    entry = segment["terms"].get(term)
+                    if not entry:
+                        continue
+                    offset, count = entry
+                    for doc_id, tf in self._postings(segment)[offset:offset + count]:
+                        key = str(int(doc_id))
+                        if self._owner.get(key) == name:
+                            hits.append((int(doc_id), int(tf), self._doc_lengths[key]))
+                if not hits:
+                    continue
+
+                idf = log(1 + (n - len(hits) + 0.5) / (len(hits) + 0.5))
+                for doc_id, tf, length in hits:
+                    norm = k1 * (1 - b + b * length / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+            return scores
+
+    def top_k(self, terms, k):
+        scores = self.score(terms)
+        return top_k(scores, k), len(scores)
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DownloadTooLarge(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """Blocking token bucket: `rate` tokens/sec, bursts of up to `capacity`"""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    def __init__(self, user_agent=None, timeout=30, max_retries=3, backoff_base=0.5,
+                 backoff_max=30.0, rate_per_host=3.0, burst=5, pool_size=10, validators_path=None):
+        """
+        Shared HTTP layer for BioC/PMC fetches:
+        - keep-alive connection pool (one requests.Session, reused by every call)
+        - retries with jittered exponential backoff on 429/5xx and connection
+          errors, honouring Retry-After
+        - per-host token-bucket rate limiting
+        - conditional GETs (ETag / Last-Modified) against a cached body on disk
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+        self.validators_path = Path(validators_path) if validators_path else None
+        self._validators = None
+        self._validators_lock = threading.Lock()
+
+    # -------------------------------
+    # Rate limiting / backoff
+    # -------------------------------
+    def _bucket(self, url):
+        host = urlsplit(url).netloc
+        with self._buckets_lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate_per_host, self.burst)
+            return bucket
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to sleep before retry number `attempt` (full jitter, Retry-After wins)"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # -------------------------------
+    # Requests
+    # -------------------------------
+    def request(self, method, url, **kwargs):
+        """
+        Send a request with rate limiting and retries. Returns the final
+        response (which may still be an error status) or raises the last
+        connection error once retries are exhausted.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        bucket = self._bucket(url)
+
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"[WARN] {method} {url} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+            delay = self._backoff(attempt, response)
+            print(f"[WARN] {method} {url} returned {response.status_code}; retrying in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    # -------------------------------
+    # Streaming downloads
+    # -------------------------------
+    def save_stream(self, response, dest_path, max_bytes=None, magic=None, chunk_size=64 * 1024):
+        """
+        Stream a (stream=True) response body to dest_path in constant memory.
+        The body goes to a temp file in the same directory, hashed on the fly,
+        then fsynced and atomically renamed, so dest_path is either complete or
+        absent. Aborts once max_bytes is exceeded, or if the first bytes do not
+        contain `magic`. Returns {"path", "sha256", "bytes"}.
+        """
+        dest_path = Path(dest_path)
+        declared = response.headers.get("Content-Length", "")
+        if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+            response.close()
+            raise DownloadTooLarge(f"{response.url} is {int(declared)} bytes (limit {max_bytes})")
+
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest_path.with_name(f".{dest_path.name}.{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if not chunk:
+                        continue
+                    if size == 0 and magic and magic not in chunk[:1024]:
+                        raise ValueError(f"{response.url} did not return the expected content")
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise DownloadTooLarge(f"{response.url} exceeded {max_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            raise
+        finally:
+            response.close()
+
+        return {"path": dest_path, "sha256": digest.hexdigest(), "bytes": size}
+
+    # -------------------------------
+    # Conditional requests
+    # -------------------------------
+    def _load_validators(self):
+        if self._validators is None:
+            self._validators = {}
+            if self.validators_path and self.validators_path.exists():
+                try:
+                    with open(self.validators_path, "r", encoding="utf-8") as f:
+                        self._validators = json.load(f)
+                except (OSError, ValueError):
+                    pass  # corrupt store: start over, bodies are simply refetched
+        return self._validators
+
+    def _save_validators(self):
+        if not self.validators_path:
+            return
+        self.validators_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.validators_path.with_name(f"{self.validators_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._validators, f)
+        os.replace(tmp, self.validators_path)
+
+    def get_conditional(self, url, cache_path, **kwargs):
+        """
+        GET url, revalidating a previously cached body at cache_path.
+        Returns (response, body_bytes); on 304 the body comes from cache_path.
+        """
+        cache_path = Path(cache_path)
+        headers = dict(kwargs.pop("headers", None) or {})
+        with self._validators_lock:
+            known = self._load_validators().get(url, {}) if cache_path.exists() else {}
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+
+        response = self.get(url, headers=headers, **kwargs)
+        if response.status_code == 304:
+            return response, cache_path.read_bytes()
+        if response.status_code != 200:
+            return response, response.content
+
+        body = response.content
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or last_modified:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, cache_path)
+            with self._validators_lock:
+                self._load_validators()[url] = {"etag": etag, "last_modified": last_modified}
+                self._save_validators()
+        return response, body
@@ -0,0 +1,158 @@
+import inspect
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, key, max_events=64):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"  # queued -> running -> done | failed
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Progress events of generator jobs, replayed to late subscribers: the
+        # last max_events while running, only the result event once finished
+        self.events = []
+        self.max_events = max_events
+        self._first = 0  # index (counting every event ever published) of events[0]
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    @property
+    def event_count(self):
+        """Events published so far, including the ones no longer buffered"""
+        return self._first + len(self.events)
+
+    def publish(self, event):
+        with self._changed:
+            self.events.append(event)
+            if len(self.events) > self.max_events:
+                del self.events[0]
+                self._first += 1
+            self._changed.notify_all()
+
+    def compact_events(self):
+        """Once finished, keep only the result event; intermediate ones are not replayed any more"""
+        with self._changed:
+            kept = [event for event in self.events if "result" in event][-1:]
+            self._first = self.event_count - len(kept)
+            self.events = kept
+
+    def wait_events(self, since=0, timeout=None):
+        """
+        (events after index `since`, index to pass next time); blocks up to
+        timeout until there are some or the job ends. Events that fell out of
+        the buffer are skipped.
+        """
+        with self._changed:
+            if self.event_count <= since and not self.done:
+                self._changed.wait(timeout)
+            return self.events[max(since - self._first, 0):], self.event_count
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    def __init__(self, max_workers=2, max_pending=64, keep_finished=256, max_events=64):
+        """
+        Background jobs on a bounded worker pool with single-flight dedup:
+        submitting a key that already has a queued/running job attaches to
+        that job instead of starting a second one.
+        A job function may be a generator: every yielded event is published
+        on the job (see Job.wait_events), and an event carrying a "result"
+        key sets the job's result. Jobs buffer at most max_events events
+        while running and only the result event once finished.
+        """
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.max_events = max_events
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job id -> Job (finished ones trimmed oldest first)
+        self._inflight = {}          # key -> Job
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Return (job, created); created is False when attaching to an in-flight job"""
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                return job, False
+            if len(self._inflight) >= self.max_pending:
+                raise JobQueueFull("Too many analysis jobs in progress, try again shortly")
+
+            job = Job(key, self.max_events)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self._trim()
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job, True
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            value = fn(*args, **kwargs)
+            if inspect.isgenerator(value):
+                for event in value:
+                    job.publish(event)
+                    if "result" in event:
+                        job.result = event["result"]
+            else:
+                job.result = value
+            job.status = "done"
+        except Exception as e:
+            print(f"[WARN] Job {job.key} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.compact_events()
+            job.finished = time.time()
+            with self._lock:
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+            with job._changed:
+                job._changed.notify_all()  # wake subscribers waiting for more events
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def find(self, key):
+        """In-flight job for key, if any"""
+        return self._inflight.get(key)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
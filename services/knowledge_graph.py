@@ -0,0 +1,412 @@
+"""
+Term co-occurrence graph over the catalog.
+
+Every publication contributes a set of key terms: the words and adjacent word
+pairs of its title, plus the most frequent terms of its body once an analysis
+is cached. Two terms are linked when they appear in the same publication, and
+edges are weighted by pointwise mutual information
+
+    PMI(a, b) = log(c(a, b) * N / (df(a) * df(b)))
+
+where N is the number of publications and df the number containing a term.
+Raw counts are stored (so new documents can be added) and PMI is computed when
+a row is read.
+
+Storage, in the current snapshot directory under <graph_dir> (services.snapshot):
+  df.npy                  (n_terms,) int64 document frequencies
+  cooc_indptr/indices/counts.npy   symmetric co-occurrence counts, CSR
+  doc_indptr/doc_terms.npy         the terms each publication contributed, CSR
+  meta.json               vocabulary, publication count, applied analyses, fingerprint
+
+Analyses cached after the snapshot was built go into an in-memory delta
+overlay (new terms, count increments, per-publication term sets). When the
+overlay grows past `compact_every` pair updates it is merged into a new CSR
+snapshot. Terms are only ever added to a publication, never removed.
+
+With several processes (serve.py), every process follows the analyses in the
+shared cache (see app.sync_analyses) and only one, the one not read_only,
+writes snapshots.
+"""
+
+import hashlib
+import json
+import threading
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from services.search_index import analyze
+from services.snapshot import current_snapshot, write_snapshot
+
+FORMAT_VERSION = 1
+
+# Title words that link everything to everything
+GRAPH_STOP_WORDS = frozenset({
+    'effect', 'effects', 'study', 'studies', 'using', 'during', 'after', 'from', 'into', 'its', 'their',
+    'this', 'that', 'these', 'those', 'new', 'via', 'role', 'analysis', 'based', 'than', 'between',
+    'under', 'over', 'through', 'not', 'can', 'has', 'have', 'had', 'which', 'who', 'also', 'may',
+    'two', 'one', 'three', 'use', 'used', 'within', 'without', 'across', 'following', 'among', 'versus',
+    'towards', 'toward', 'what', 'when', 'how', 'does', 'did', 'but', 'all', 'more', 'less', 'both',
+    'other', 'such', 'here', 'there', 'our', 'were', 'been', 'while', 'each', 'non', 'novel',
+})
+
+ANALYSIS_PREFIX = "analysis:pub:"
+
+
+def key_terms(text, limit=None, min_count=1):
+    """
+    Words and adjacent word pairs ('bone loss') of text, most frequent first;
+    with limit, only the `limit` most frequent that occur at least min_count times
+    """
+    words = analyze(text) if isinstance(text, str) else []
+    words = [None if w in GRAPH_STOP_WORDS or w.isdigit() else w for w in words]
+    counts = Counter(w for w in words if w)
+    counts.update(f"{a} {b}" for a, b in zip(words, words[1:]) if a and b)
+    ranked = [term for term, n in sorted(counts.items(), key=lambda item: (-item[1], item[0])) if n >= min_count]
+    return ranked[:limit] if limit else ranked
+
+
+def _overlaps(a, b):
+    """Terms sharing a word ('bone' and 'bone loss') co-occur by construction"""
+    return not set(a.split()).isdisjoint(b.split())
+
+
+def _csr(rows, cols, values, n_rows):
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), values[order].astype(np.int64)
+
+
+class KnowledgeGraph:
+    def __init__(self, graph_dir="data/cache/graph", body_terms=25, min_cooccurrence=2,
+                 compact_every=20000, max_depth=3, max_limit=25, max_nodes=150, read_only=False):
+        """
+        - body_terms: terms taken from each cached body (the most frequent ones)
+        - min_cooccurrence: pairs seen in fewer publications are not edges
+        - compact_every: overlay pair updates before the overlay is merged and saved
+        - max_depth / max_limit / max_nodes bound the size of a neighbourhood query
+        - read_only: never write snapshots (every process but one, when several share graph_dir)
+        """
+        self.graph_dir = Path(graph_dir)
+        self.read_only = read_only
+        self.body_terms = body_terms
+        self.min_cooccurrence = min_cooccurrence
+        self.compact_every = compact_every
+        self.max_depth = max_depth
+        self.max_limit = max_limit
+        self.max_nodes = max_nodes
+
+        self._lock = threading.RLock()
+        self.vocabulary = {}
+        self.terms = []
+        self.df = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+        self.applied = set()
+        self.fingerprint = None
+        self._cooc = (np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64))
+        self._docs = (np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        self._reset_overlay()
+
+    def _reset_overlay(self):
+        self._delta = {}        # term id -> {term id: added co-occurrences}
+        self._delta_docs = {}   # publication -> set of term ids (replaces its CSR row)
+        self._delta_pairs = 0
+
+    def __len__(self):
+        return len(self.terms)
+
+    # -------------------------------
+    # Build / persist
+    # -------------------------------
+    @staticmethod
+    def _fingerprint(titles):
+        digest = hashlib.sha256(str(FORMAT_VERSION).encode("utf-8"))
+        for title in titles:
+            digest.update(title.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _term_id(self, term):
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            term_id = self.vocabulary[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def build(self, titles, bodies=None):
+        """Full build from catalog titles and {row position: body text}; persists the snapshot"""
+        titles = list(titles)
+        bodies = bodies or {}
+        with self._lock:
+            self.vocabulary, self.terms = {}, []
+            doc_sets = []
+            for pos, title in enumerate(titles):
+                terms = set(key_terms(title))
+                if pos in bodies:
+                    terms.update(key_terms(bodies[pos], self.body_terms, min_count=2))
+                doc_sets.append(sorted(self._term_id(t) for t in terms))
+
+            n_terms = len(self.terms)
+            doc_lengths = np.array([len(ids) for ids in doc_sets], dtype=np.int64)
+            doc_indptr = np.zeros(len(doc_sets) + 1, dtype=np.int64)
+            np.cumsum(doc_lengths, out=doc_indptr[1:])
+            doc_terms = np.array([t for ids in doc_sets for t in ids], dtype=np.int32)
+
+            # Every unordered pair within a publication, counted once per publication
+            pair_keys = []
+            for ids in doc_sets:
+                if len(ids) > 1:
+                    ids = np.asarray(ids, dtype=np.int64)
+                    i, j = np.triu_indices(len(ids), k=1)
+                    pair_keys.append(ids[i] * n_terms + ids[j])
+            keys, counts = np.unique(np.concatenate(pair_keys) if pair_keys else np.zeros(0, np.int64),
+                                     return_counts=True)
+            a, b = keys // max(n_terms, 1), keys % max(n_terms, 1)
+
+            self.df = np.bincount(doc_terms, minlength=n_terms).astype(np.int64)
+            self.n_docs = len(titles)
+            self._cooc = _csr(np.concatenate([a, b]), np.concatenate([b, a]), np.concatenate([counts, counts]),
+                              n_terms)
+            self._docs = (doc_indptr, doc_terms)
+            self.applied = set(bodies)
+            self.fingerprint = self._fingerprint(titles)
+            self._reset_overlay()
+            self.save()
+        return self
+
+    def save(self):
+        """Write a new snapshot and switch to it atomically (no-op when read_only)"""
+        if self.read_only:
+            return
+        with self._lock:
+            arrays = {
+                "df": self.df,
+                "cooc_indptr": self._cooc[0], "cooc_indices": self._cooc[1], "cooc_counts": self._cooc[2],
+                "doc_indptr": self._docs[0], "doc_terms": self._docs[1],
+            }
+            meta = {"version": FORMAT_VERSION, "fingerprint": self.fingerprint, "documents": self.n_docs,
+                    "terms": list(self.terms), "applied": sorted(self.applied)}
+
+            def write(path):
+                for name, array in arrays.items():
+                    np.save(path / f"{name}.npy", array)
+                with open(path / "meta.json", "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+
+            write_snapshot(self.graph_dir, write)
+
+    def load(self):
+        """Load the current snapshot (arrays memory-mapped); False when there is none"""
+        path = current_snapshot(self.graph_dir)
+        if path is None:
+            return False
+        try:
+            with open(path / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != FORMAT_VERSION:
+                return False
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in (
+                "cooc_indptr", "cooc_indices", "cooc_counts", "doc_indptr", "doc_terms")}
+            df = np.load(path / "df.npy")
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.terms = meta["terms"]
+            self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+            self.df = np.array(df, dtype=np.int64)
+            self.n_docs = meta["documents"]
+            self.applied = set(meta.get("applied", []))
+            self.fingerprint = meta.get("fingerprint")
+            self._cooc = (arrays["cooc_indptr"], arrays["cooc_indices"], arrays["cooc_counts"])
+            self._docs = (arrays["doc_indptr"], arrays["doc_terms"])
+            self._reset_overlay()
+        return True
+
+    def load_or_build(self, titles, bodies=None):
+        """
+        Reuse the snapshot when it was built from the same titles, adding any
+        cached bodies it has not seen through the overlay; otherwise rebuild
+        """
+        titles = list(titles)
+        bodies = bodies or {}
+        if self.load() and self.fingerprint == self._fingerprint(titles):
+            for pos in sorted(set(bodies) - self.applied):
+                self.add_body(pos, bodies[pos])
+            return self
+        return self.build(titles, bodies)
+
+    # -------------------------------
+    # Incremental updates
+    # -------------------------------
+    def _doc_terms(self, pos):
+        if pos in self._delta_docs:
+            return self._delta_docs[pos]
+        indptr, terms = self._docs
+        if pos + 1 < len(indptr):
+            return set(terms[indptr[pos]:indptr[pos + 1]].tolist())
+        return set()
+
+    def add_body(self, pos, text):
+        """Add the key terms of a publication's body; only terms it did not have yet change counts"""
+        terms = key_terms(text, self.body_terms, min_count=2)
+        with self._lock:
+            old = self._doc_terms(pos)
+            new = {self._term_id(t) for t in terms} - old
+            if len(self.df) < len(self.terms):
+                self.df = np.concatenate([self.df, np.zeros(len(self.terms) - len(self.df), dtype=np.int64)])
+            if pos >= self.n_docs:
+                self.n_docs = pos + 1
+            self.applied.add(pos)
+            if not new:
+                return 0
+            self.df[list(new)] += 1
+            pairs = 0
+            for a in new:
+                for b in (old | new) - {a}:
+                    if b in new and b < a:
+                        continue  # new-new pairs once
+                    row_a, row_b = self._delta.setdefault(a, {}), self._delta.setdefault(b, {})
+                    row_a[b] = row_a.get(b, 0) + 1
+                    row_b[a] = row_b.get(a, 0) + 1
+                    pairs += 1
+            self._delta_docs[pos] = old | new
+            self._delta_pairs += pairs
+            if self._delta_pairs >= self.compact_every:
+                self.compact()
+            return pairs
+
+    def on_analysis(self, key, result):
+        """CacheStore listener for analysis:pub:<id> entries"""
+        pub_id = key[len(ANALYSIS_PREFIX):]
+        if pub_id.isdigit() and result.get("text_preview"):
+            self.add_body(int(pub_id), result["text_preview"])
+
+    def flush(self):
+        """Compact and persist pending overlay updates, if any"""
+        with self._lock:
+            if self._delta_docs:
+                self.compact()
+
+    def compact(self):
+        """Merge the overlay into a new CSR snapshot and persist it"""
+        with self._lock:
+            n_terms = len(self.terms)
+            indptr, indices, counts = self._cooc
+            rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+            d_rows = [a for a, row in self._delta.items() for _ in row]
+            d_cols = [b for row in self._delta.values() for b in row]
+            d_vals = [n for row in self._delta.values() for n in row.values()]
+            keys = np.concatenate([rows * n_terms + np.asarray(indices, dtype=np.int64),
+                                   np.asarray(d_rows, dtype=np.int64) * n_terms + np.asarray(d_cols, dtype=np.int64)])
+            values = np.concatenate([np.asarray(counts, dtype=np.int64), np.asarray(d_vals, dtype=np.int64)])
+            keys, inverse = np.unique(keys, return_inverse=True)
+            summed = np.bincount(inverse, weights=values).astype(np.int64)
+            self._cooc = _csr(keys // n_terms, keys % n_terms, summed, n_terms)
+
+            doc_sets = [sorted(self._doc_terms(pos)) for pos in range(self.n_docs)]
+            doc_indptr = np.zeros(len(doc_sets) + 1, dtype=np.int64)
+            np.cumsum([len(ids) for ids in doc_sets], out=doc_indptr[1:])
+            self._docs = (doc_indptr, np.array([t for ids in doc_sets for t in ids], dtype=np.int32))
+            self._reset_overlay()
+            self.save()
+
+    # -------------------------------
+    # Query
+    # -------------------------------
+    def resolve(self, term):
+        """Vocabulary id for a user-typed term (analyzed the same way), or None"""
+        words = [w for w in analyze(term or "") if w not in GRAPH_STOP_WORDS]
+        for candidate in (" ".join(words), *(f"{a} {b}" for a, b in zip(words, words[1:])), *words):
+            if candidate in self.vocabulary:
+                return self.vocabulary[candidate]
+        return None
+
+    def neighbors(self, term_id, limit):
+        """Top `limit` (term id, PMI, co-occurrences) for a term, by co-occurrences * PMI"""
+        with self._lock:
+            indptr, indices, counts = self._cooc
+            if term_id + 1 < len(indptr):
+                cols = np.asarray(indices[indptr[term_id]:indptr[term_id + 1]], dtype=np.int64)
+                cnts = np.asarray(counts[indptr[term_id]:indptr[term_id + 1]], dtype=np.int64)
+            else:
+                cols, cnts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            delta = self._delta.get(term_id)
+            if delta:
+                cols, inverse = np.unique(np.concatenate([cols, np.fromiter(delta, dtype=np.int64)]),
+                                          return_inverse=True)
+                cnts = np.bincount(inverse, weights=np.concatenate(
+                    [cnts, np.fromiter(delta.values(), dtype=np.int64)])).astype(np.int64)
+            df, n_docs = self.df, max(self.n_docs, 1)
+
+        keep = cnts >= self.min_cooccurrence
+        cols, cnts = cols[keep], cnts[keep]
+        pmi = np.log(cnts * n_docs / (df[term_id] * df[cols]))
+        term = self.terms[term_id]
+        keep = (pmi > 0) & np.array([not _overlaps(term, self.terms[c]) for c in cols], dtype=bool)
+        cols, cnts, pmi = cols[keep], cnts[keep], pmi[keep]
+        # Rank by count * PMI: plain PMI favours pairs of terms seen only twice
+        strength = cnts * pmi
+        if len(cols) > limit:
+            top = np.argpartition(-strength, limit - 1)[:limit]
+            cols, cnts, pmi, strength = cols[top], cnts[top], pmi[top], strength[top]
+        order = np.lexsort((cols, -strength))
+        return [(int(cols[i]), float(pmi[i]), int(cnts[i])) for i in order]
+
+    def subgraph(self, term, depth=1, limit=10):
+        """
+        Bounded BFS from term: each visited node keeps its `limit` strongest
+        edges and expansion stops at `depth` hops or max_nodes nodes.
+        Returns {"term", "nodes": [{id, label, df, depth}], "edges": [{source, target, weight, count}]}
+        with edge endpoints given as node list indices, or None for an unknown term.
+        """
+        root = self.resolve(term)
+        if root is None:
+            return None
+        depth = max(1, min(int(depth), self.max_depth))
+        limit = max(1, min(int(limit), self.max_limit))
+
+        index = {root: 0}
+        nodes = [{"id": 0, "label": self.terms[root], "df": int(self.df[root]), "depth": 0}]
+        edges, seen_edges = [], set()
+        frontier = [root]
+        for level in range(1, depth + 1):
+            next_frontier = []
+            for term_id in frontier:
+                for other, pmi, count in self.neighbors(term_id, limit):
+                    if other not in index:
+                        if len(nodes) >= self.max_nodes:
+                            continue
+                        index[other] = len(nodes)
+                        nodes.append({"id": len(nodes), "label": self.terms[other],
+                                      "df": int(self.df[other]), "depth": level})
+                        next_frontier.append(other)
+                    pair = tuple(sorted((index[term_id], index[other])))
+                    if pair not in seen_edges:
+                        seen_edges.add(pair)
+                        edges.append({"source": pair[0], "target": pair[1], "weight": round(pmi, 4),
+                                      "count": count})
+            frontier = next_frontier
+            if not frontier:
+                break
+        return {"term": self.terms[root], "nodes": nodes, "edges": edges}
+
+    def terms_for(self, text, limit=6):
+        """Graph terms of a text (e.g. a title) that have edges, most frequent in the catalog first"""
+        found = []
+        for term in key_terms(text):
+            term_id = self.vocabulary.get(term)
+            if term_id is not None and self.neighbors(term_id, 1):
+                found.append((self.df[term_id], term))
+        return [term for _, term in sorted(found, key=lambda item: (-item[0], item[1]))][:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "terms": len(self.terms),
+                "documents": self.n_docs,
+                "edges": int(len(self._cooc[1]) // 2),
+                "bodies": len(self.applied),
+                "overlay_pairs": self._delta_pairs,
+            }
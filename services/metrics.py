@@ -0,0 +1,247 @@
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def snapshot(self):
+        """{label values tuple: value}"""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with histogram.time(stage="x"): ... records the block's wall time"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """Decorator form of time()"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        out = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                out.append((f"{self.name}_bucket", _labels(self.labelnames, key, [("le", _number(bound))]), count))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, key), series[-2]))
+            out.append((f"{self.name}_count", _labels(self.labelnames, key), series[-1]))
+        return out
+
+
+class GaugeCallback:
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames, fn):
+        """Gauge read at scrape time: fn() returns {label values tuple: value}"""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"[WARN] Metric {self.name} failed: {e}")
+            return []
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in values.items()]
+
+
+class MetricsRegistry:
+    def __init__(self, namespace="nbe"):
+        """Process-wide metrics, rendered in the Prometheus text format (0.0.4)"""
+        self.namespace = namespace
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        name = f"{self.namespace}_{name}" if self.namespace else name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def gauge_callback(self, name, help, labelnames, fn):
+        return self._register(GaugeCallback, name, help, labelnames, fn)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Shared instruments (services import these instead of re-declaring them)
+STAGE_SECONDS = metrics.histogram(
+    "stage_seconds", "Wall time of pipeline stages", ("stage",))
+SUMMARIZER_SECONDS = metrics.histogram(
+    "summarizer_call_seconds", "Wall time of one summarizer call (a batch of chunks)", ("model",))
+SUMMARIZER_CHUNKS = metrics.counter(
+    "summarizer_chunks_total", "Chunks sent through the summarizer", ("model",))
+CACHE_REQUESTS = metrics.counter(
+    "cache_requests_total", "Cache lookups by cache and outcome", ("cache", "result"))
+SOURCE_TOTAL = metrics.counter(
+    "publication_source_total", "Publications analysed, by where their text came from", ("source",))
+BIOC_FALLBACKS = metrics.counter(
+    "bioc_fallback_total", "BioC lookups that fell back to the PDF path", ("reason",))
+HTTP_SECONDS = metrics.histogram(
+    "http_request_seconds", "Flask request latency", ("endpoint", "method", "status"))
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _hit_ratios():
+    totals = {}
+    for (cache, result), value in CACHE_REQUESTS.snapshot().items():
+        totals.setdefault(cache, {"hit": 0, "miss": 0})[result] += value
+    return {(cache,): t["hit"] / (t["hit"] + t["miss"]) for cache, t in totals.items() if t["hit"] + t["miss"]}
+
+
+metrics.gauge_callback("cache_hit_ratio", "Hits / lookups since start, per cache", ("cache",), _hit_ratios)
+
+
+class RequestProfiler:
+    def __init__(self, output_dir="data/cache/profiles", sample_rate=0.0, top=40):
+        """
+        Opt-in cProfile per request: a request is profiled when it asks for it
+        (?profile=1 or an X-Profile header) or is picked by sample_rate. One
+        request is profiled at a time; the rest run unprofiled. Each profile is
+        written as <output_dir>/<time>-<endpoint>.prof plus a .txt summary of
+        the top functions by cumulative time.
+        """
+        self.output_dir = Path(output_dir)
+        self.sample_rate = sample_rate
+        self.top = top
+        self._busy = threading.Lock()
+
+    def start(self, requested):
+        """Return a running profiler, or None when this request is not profiled"""
+        if not (requested or (self.sample_rate and random.random() < self.sample_rate)):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler already active in this interpreter
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler, label):
+        """Stop and persist; returns the .prof path"""
+        try:
+            profiler.disable()
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{label}"
+            path = self.output_dir / f"{name}.prof"
+            profiler.dump_stats(str(path))
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(self.top)
+            path.with_suffix(".txt").write_text(report.getvalue(), encoding="utf-8")
+            return path
+        finally:
+            self._busy.release()
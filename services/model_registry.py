@@ -0,0 +1,150 @@
+import os
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # optional; /proc or resource is used instead
+    psutil = None
+
+
+def current_rss_bytes():
+    """Resident set size of this process in bytes (0 if it cannot be determined)"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # peak, not current
+    except ImportError:
+        return 0
+
+
+SMAPS_FIELDS = {
+    "Rss": "rss", "Pss": "pss", "Shared_Clean": "shared_clean", "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean", "Private_Dirty": "private_dirty", "Anonymous": "anonymous", "Swap": "swap",
+}
+
+
+def memory_breakdown(pid="self"):
+    """
+    Memory of a process in bytes from /proc/<pid>/smaps_rollup (Linux 4.14+):
+    rss, pss (shared pages divided among the processes mapping them),
+    shared_clean/dirty, private_clean/dirty, anonymous and swap. Falls back to
+    rss/shared from /proc/<pid>/statm, and to rss alone elsewhere.
+    """
+    try:
+        stats = {}
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    stats[SMAPS_FIELDS[name]] = int(rest.split()[0]) * 1024
+        if stats:
+            stats["shared"] = stats.get("shared_clean", 0) + stats.get("shared_dirty", 0)
+            return stats
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            pages = f.read().split()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        return {"rss": int(pages[1]) * page_size, "shared": int(pages[2]) * page_size}
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return {"rss": current_rss_bytes()} if pid == "self" else {}
+
+
+class ModelRegistry:
+    def __init__(self):
+        """
+        Process-wide registry of heavyweight models (summarizers, tokenizers).
+        - register(name, loader) is cheap; nothing is loaded at import time
+        - get(name) loads once on first use; concurrent callers wait for that load
+        - warm_up() loads registered models in a background thread after boot
+        - stats() reports status, load time and RSS growth per model
+        """
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders.setdefault(name, loader)
+            self._locks.setdefault(name, threading.Lock())
+            self._stats.setdefault(name, {"status": "registered"})
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name, loader=None):
+        """Return the model, loading it (once, process-wide) if needed"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if loader is not None:
+            self.register(name, loader)
+        if name not in self._loaders:
+            raise KeyError(f"No loader registered for model: {name}")
+
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            self._stats[name] = {"status": "loading"}
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._stats[name] = {"status": "failed", "error": str(e)}
+                raise
+
+            load_seconds = time.perf_counter() - start
+            rss_delta = max(current_rss_bytes() - rss_before, 0)
+            self._models[name] = model
+            self._stats[name] = {
+                "status": "loaded",
+                "load_seconds": round(load_seconds, 3),
+                "rss_delta_mb": round(rss_delta / (1024 * 1024), 1),
+            }
+            print(f"Loaded model {name} in {load_seconds:.1f}s (+{rss_delta / (1024 * 1024):.0f} MB RSS)")
+            return model
+
+    def warm_up(self, names=None, background=True):
+        """Load the given (default: all registered) models, optionally in a daemon thread"""
+        names = list(names or self._loaders)
+
+        def _load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"[WARN] Warm-up failed for {name}: {e}")
+
+        if not background:
+            _load_all()
+            return None
+        thread = threading.Thread(target=_load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {
+            "rss_mb": round(current_rss_bytes() / (1024 * 1024), 1),
+            "models": {name: dict(stat) for name, stat in self._stats.items()},
+        }
+
+
+# Shared by every service in the process
+registry = ModelRegistry()
@@ -1,48 +1,177 @@
+import atexit
+import multiprocessing
 import os
 import json
-import requests
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PyPDF2 import PdfReader
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from services.ai_analyzer import AIAnalyzer
+from services.fulltext_index import FullTextIndex
+from services.http_client import HttpClient
+from services.text_store import TextStore, file_sha256, text_sha256
+from services.cache_store import CacheStore
+from services.catalog import parse_pmcid
+from services.document import Document
+from services.metrics import STAGE_SECONDS, SOURCE_TOTAL, BIOC_FALLBACKS
+from config import Config
+
+# Extraction helpers are module-level so they can run in process pools
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+
+def _pool_context():
+    """
+    Start method for extraction pools. The pool is created lazily from a
+    request thread of a multithreaded server, so forking could copy locks
+    held by other threads; forkserver children start clean (spawn on Windows).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _get_page_pool(workers):
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+        return _page_pool
+
+
+@atexit.register
+def shutdown_page_pool():
+    """Stop the extraction pool, if one was started (at exit, and by serve.py workers)"""
+    global _page_pool
+    with _page_pool_lock:
+        pool, _page_pool = _page_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_page_range(pdf_path, start, end):
+    reader = PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def extract_pdf_pages(pdf_path, workers=1, pages_per_task=8) -> list:
+    """
+    Text of every page, in order. With workers > 1, PDFs of at least two
+    ranges are split into page ranges extracted across a process pool
+    (shorter ones are cheaper to do inline than to ship to workers).
+    """
+    pdf_path = Path(pdf_path)
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+
+    reader = PdfReader(str(pdf_path))
+    n_pages = len(reader.pages)
+    if workers <= 1 or n_pages < 2 * pages_per_task:
+        return [page.extract_text() or "" for page in reader.pages]
+
+    pool = _get_page_pool(workers)
+    futures = [pool.submit(_extract_page_range, str(pdf_path), start, min(start + pages_per_task, n_pages))
+               for start in range(0, n_pages, pages_per_task)]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def extract_pdf_text(pdf_path, workers=1) -> str:
+    return "\n".join(extract_pdf_pages(pdf_path, workers)).strip()
+
+
+def pdf_content_key(pdf_path) -> str:
+    """SHA-256 of the PDF, from the sidecar written at download time when present"""
+    sha_path = Path(str(pdf_path) + ".sha256")
+    if sha_path.exists():
+        return sha_path.read_text(encoding="utf-8").strip()
+    return file_sha256(pdf_path)
+
+
+def extract_to_store(pdf_path, store_dir, workers=1):
+    """
+    Return (content key, text) for a PDF, extracting at most once per content:
+    pages are persisted in the TextStore under the PDF's SHA-256.
+    """
+    store = TextStore(store_dir)
+    key = pdf_content_key(pdf_path)
+    if store.has(key):
+        return key, store.read_text(key)
+    pages = extract_pdf_pages(pdf_path, workers)
+    store.put(key, pages)
+    return key, "\n".join(pages).strip()
+
 
 class PDFProcessor:
-    def __init__(self, pdf_dir="data/pdfs", cache_dir="data/cache"):
+    def __init__(self, pdf_dir="data/pdfs", cache_dir="data/cache", fulltext_index=None, ai_analyzer=None,
+                 http_client=None, cache_store=None):
         self.pdf_dir = Path(pdf_dir)
         self.cache_dir = Path(cache_dir)
         self.pdf_dir.mkdir(parents=True, exist_ok=True)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._remove_stale_partials()
+
+        # On-disk body index, extended every time a publication is processed
+        self.fulltext_index = fulltext_index or FullTextIndex(self.cache_dir / "fulltext")
+
+        # Extracted text, persisted per content hash with per-page offsets
+        self.text_store = TextStore(self.cache_dir / "text")
+
+        # One store (TTL, byte budgets, hot tier) for analyses, PDFs and extracted text
+        self.cache = cache_store or CacheStore.from_config(self.cache_dir)
+        self._import_legacy_cache()
+        self.extract_workers = Config.EXTRACT_WORKERS
+
+        # Pooled HTTP client (keep-alive, retries, per-host rate limit) for BioC and PMC
+        self.http = http_client or HttpClient(
+            timeout=Config.PDF_TIMEOUT,
+            max_retries=Config.MAX_RETRIES,
+            validators_path=self.cache_dir / "http_validators.json"
+        )
 
         # Initialize AI summarizer
-        self.ai_analyzer = AIAnalyzer(model_name="t5-small")
+        self.ai_analyzer = ai_analyzer or AIAnalyzer(model_name="t5-small")
+
+    def _remove_stale_partials(self, max_age_seconds=3600):
+        """Drop temp files left behind by downloads killed mid-stream"""
+        cutoff = time.time() - max_age_seconds
+        for part in self.pdf_dir.glob(".*.part"):
+            try:
+                if part.stat().st_mtime < cutoff:
+                    part.unlink()
+            except OSError:
+                pass
 
     # -------------------------------
     # PubMed Central (PMC) BioC API
     # -------------------------------
-    def fetch_from_bioc_api(self, pub_id: str) -> dict:
-        url = f"https://www.ncbi.nlm.nih.gov/research/bionlp/RESTful/pmcoa.cgi/BioC_json/{pub_id}/unicode"
-        resp = requests.get(url, timeout=30)
+    @STAGE_SECONDS.timed(stage="bioc_fetch")
+    def fetch_from_bioc_api(self, pmcid: str) -> dict:
+        url = f"https://www.ncbi.nlm.nih.gov/research/bionlp/RESTful/pmcoa.cgi/BioC_json/{pmcid}/unicode"
+        # Conditional GET: a cached copy is revalidated instead of downloaded again
+        resp, body = self.http.get_conditional(url, self.cache_dir / "bioc" / f"{pmcid}.json")
 
-        if resp.status_code != 200:
-            raise RuntimeError(f"BioC API request failed for {pub_id}: {resp.status_code}")
+        if resp.status_code not in (200, 304):
+            raise RuntimeError(f"BioC API request failed for {pmcid}: {resp.status_code}")
 
-        data = resp.json()
-        passages = []
-        for doc in data.get("documents", []):
-            for passage in doc.get("passages", []):
-                text = passage.get("text")
-                if text:
-                    passages.append(text)
+        data = json.loads(body)
+        document = Document.from_bioc(data)  # keeps the passages' section_type labels
 
         return {
-            "text": "\n".join(passages).strip(),
+            "text": document.text,
+            "document": document,
             "meta": data
         }
 
     # -------------------------------
     # PDF download + extract fallback
     # -------------------------------
+    @STAGE_SECONDS.timed(stage="pdf_download")
     def download_pdf(self, pub, pub_id):
         base_url = pub["Link"].strip()
         if not base_url.startswith("http"):
@@ -51,7 +180,12 @@ class PDFProcessor:
         pdf_url = base_url.rstrip("/") + "/pdf/"
         pdf_path = self.pdf_dir / f"pub_{pub_id}.pdf"
 
+        cached_path = self.cache.get_file(f"pdf:pub:{pub_id}")
+        if cached_path is not None:
+            return cached_path
+        # Downloads are renamed into place only when complete, so this is never a partial file
         if pdf_path.exists():
+            self._register_pdf(pub_id, pdf_path)
             return pdf_path
 
         headers = {
@@ -64,12 +198,10 @@ class PDFProcessor:
             "Referer": "https://pmc.ncbi.nlm.nih.gov/"
         }
 
-        response = requests.get(pdf_url, headers=headers, timeout=30, allow_redirects=True)
+        response = self.http.get(pdf_url, headers=headers, allow_redirects=True, stream=True)
 
         if "application/pdf" in response.headers.get("Content-Type", ""):
-            with open(pdf_path, "wb") as f:
-                f.write(response.content)
-            return pdf_path
+            return self._save_pdf(response, pdf_path, pub_id)
 
         soup = BeautifulSoup(response.text, "html.parser")
         pdf_link = None
@@ -82,61 +214,177 @@ class PDFProcessor:
             raise RuntimeError(f"No PDF link found at {pdf_url}")
 
         pdf_link = urljoin(pdf_url, pdf_link)
-        pdf_resp = requests.get(pdf_link, headers=headers, timeout=30, allow_redirects=True)
+        pdf_resp = self.http.get(pdf_link, headers=headers, allow_redirects=True, stream=True)
         pdf_resp.raise_for_status()
 
-        with open(pdf_path, "wb") as f:
-            f.write(pdf_resp.content)
+        return self._save_pdf(pdf_resp, pdf_path, pub_id)
 
+    def _save_pdf(self, response, pdf_path: Path, pub_id) -> Path:
+        """Stream to disk (size-capped, atomic) and record the SHA-256 next to the PDF"""
+        saved = self.http.save_stream(
+            response, pdf_path,
+            max_bytes=int(Config.MAX_PDF_SIZE_MB * 1024 * 1024),
+            magic=b"%PDF"
+        )
+        sha_path = pdf_path.with_name(pdf_path.name + ".sha256")
+        tmp_path = sha_path.with_name(f"{sha_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(saved["sha256"], encoding="utf-8")
+        os.replace(tmp_path, sha_path)
+        self._register_pdf(pub_id, pdf_path)
         return pdf_path
 
-    def extract_text(self, pdf_path: Path) -> str:
-        if not pdf_path.exists():
-            raise FileNotFoundError(f"PDF not found: {pdf_path}")
+    @STAGE_SECONDS.timed(stage="extract")
+    def extract(self, pdf_path: Path):
+        """(content key, text); re-extraction of a known PDF reads the text store"""
+        text_key, text = extract_to_store(pdf_path, self.text_store.store_dir, self.extract_workers)
+        self._register_text(text_key)
+        return text_key, text
 
-        reader = PdfReader(str(pdf_path))
-        text = []
-        for page in reader.pages:
-            text.append(page.extract_text() or "")
-        return "\n".join(text).strip()
+    def extract_text(self, pdf_path: Path) -> str:
+        return self.extract(pdf_path)[1]
 
     # -------------------------------
-    # Main handler
+    # Cache
     # -------------------------------
-    def process_publication(self, pub, pub_id):
-        cache_file = self.cache_dir / f"pub_{pub_id}_analysis.json"
-        if cache_file.exists():
-            with open(cache_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+    def _import_legacy_cache(self):
+        """One-time import of pub_{id}_analysis.json files and PDFs cached before the store existed"""
+        if self.cache.has("meta:legacy-imported"):
+            return
+        for path in self.cache_dir.glob("pub_*_analysis.json"):
+            pub_id = path.name[len("pub_"):-len("_analysis.json")]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.save_cached(int(pub_id) if pub_id.isdigit() else pub_id, json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Skipping unreadable cache file {path}: {e}")
+        for pdf_path in self.pdf_dir.glob("pub_*.pdf"):
+            self._register_pdf(pdf_path.stem[len("pub_"):], pdf_path)
+        self.cache.put_json("meta:legacy-imported", True, kind="meta", ttl=0)
+
+    def _register_pdf(self, pub_id, pdf_path: Path):
+        sha_path = pdf_path.with_name(pdf_path.name + ".sha256")
+        if not sha_path.exists():
+            sha_path.write_text(file_sha256(pdf_path), encoding="utf-8")
+        sha256 = sha_path.read_text(encoding="utf-8").strip()
+        self.cache.put_file(f"pdf:pub:{pub_id}", [pdf_path, sha_path], kind="pdf", tag=sha256, ttl=0)
+
+    def _register_text(self, text_key):
+        if not self.cache.has(f"text:{text_key}"):
+            self.cache.put_file(f"text:{text_key}", self.text_store.paths(text_key), kind="text", ttl=0)
 
-        text = ""
-        used_api = False
+    def get_cached(self, pub_id):
+        """Cached analysis for pub_id, or None"""
+        return self.cache.get_json(f"analysis:pub:{pub_id}")
 
-        if "pmc.ncbi.nlm.nih.gov" in pub["Link"].lower() or str(pub_id).startswith("PMC"):
+    def save_cached(self, pub_id, result):
+        self.cache.put_json(f"analysis:pub:{pub_id}", result, kind="analysis")
+
+    def cached_bodies(self):
+        """{pub_id: body text preview} for every catalog publication with a cached analysis"""
+        bodies = {}
+        for key, result in self.cache.scan_json("analysis:pub:"):
+            pub_id = key[len("analysis:pub:"):]
+            if pub_id.isdigit() and result.get("text_preview"):
+                bodies[int(pub_id)] = result["text_preview"]
+        return bodies
+
+    def find_pub_by_sha(self, sha256):
+        """Catalog pub_id whose downloaded PDF has this SHA-256, or None"""
+        key = self.cache.find_by_tag("pdf", sha256, prefix="pdf:pub:")
+        if key is None:
+            return None
+        pub_id = key[len("pdf:pub:"):]
+        return int(pub_id) if pub_id.isdigit() else pub_id
+
+    # -------------------------------
+    # Pipeline stages
+    # -------------------------------
+    def fetch_source(self, pub, pub_id) -> dict:
+        """
+        Network stage: BioC text when available, otherwise a downloaded PDF.
+        Returns {"source": "BioC API", "text": ..., "document": ...} or {"source": "PDF", "pdf_path": ...}
+        """
+        # BioC is keyed by PMCID, not by our catalog row number
+        pmcid = pub.get("PMCID") or parse_pmcid(pub.get("Link")) or parse_pmcid(str(pub_id))
+        if not pmcid:
+            BIOC_FALLBACKS.inc(reason="no_pmcid")
+        else:
             try:
-                bioc_data = self.fetch_from_bioc_api(pub_id)
-                text = bioc_data["text"]
-                used_api = True
+                bioc_data = self.fetch_from_bioc_api(pmcid)
+                if bioc_data["text"]:
+                    SOURCE_TOTAL.inc(source="bioc")
+                    return {"source": "BioC API", "text": bioc_data["text"], "document": bioc_data["document"]}
+                BIOC_FALLBACKS.inc(reason="empty")
             except Exception as e:
+                BIOC_FALLBACKS.inc(reason="error")
                 print(f"[WARN] BioC API failed: {e}. Falling back to PDF.")
 
-        if not text:
-            pdf_path = self.download_pdf(pub, pub_id)
-            text = self.extract_text(pdf_path)
+        pdf_path = self.download_pdf(pub, pub_id)
+        SOURCE_TOTAL.inc(source="pdf")
+        return {"source": "PDF", "pdf_path": pdf_path}
 
-        # 🔥 Use AIAnalyzer for summary
-        summary = self.ai_analyzer.summarize(text)
+    def finalize(self, pub, pub_id, source, text, summary, text_key=None) -> dict:
+        """Index the body, build the analysis record and cache it"""
+        if text_key is None:
+            # BioC text: store it too so later stages can slice it without refetching
+            text_key = text_sha256(text)
+            self.text_store.put(text_key, [text])
+        self._register_text(text_key)
+
+        if isinstance(pub_id, int):
+            try:
+                self.fulltext_index.add_document(pub_id, text)
+            except Exception as e:
+                print(f"[WARN] Full-text indexing failed for {pub_id}: {e}")
 
         result = {
             "pub_id": pub_id,
             "title": pub["Title"],
             "link": pub["Link"],
-            "source": "BioC API" if used_api else "PDF",
+            "pmcid": pub.get("PMCID"),
+            "source": source,
             "summary": summary,
-            "text_preview": text[:2000]  # first 2000 chars
+            "text_preview": text[:2000],  # first 2000 chars
+            "text_key": text_key  # full text in the text store
         }
 
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2)
-
+        self.save_cached(pub_id, result)
         return result
+
+    # -------------------------------
+    # Main handler
+    # -------------------------------
+    def process_publication_stream(self, pub, pub_id):
+        """
+        The analysis pipeline as a generator of progress events:
+        {"event": "stage", "stage": "fetch" | "extract" | "summarize"}, then the
+        analyzer's chunk/reduce/knowledge_gaps events, and finally
+        {"event": "result", "result": <cached analysis dict>}.
+        """
+        cached = self.get_cached(pub_id)
+        if cached is not None:
+            yield {"event": "result", "result": cached}
+            return
+
+        yield {"event": "stage", "stage": "fetch"}
+        fetched = self.fetch_source(pub, pub_id)
+        text, text_key = fetched.get("text"), None
+        if not text:
+            yield {"event": "stage", "stage": "extract"}
+            text_key, text = self.extract(fetched["pdf_path"])
+
+        # 🔥 Use AIAnalyzer for summary (BioC keeps its sections; PDF text is split at headings)
+        yield {"event": "stage", "stage": "summarize", "source": fetched["source"]}
+        summary = None
+        for event in self.ai_analyzer.summarize_stream(fetched.get("document") or text):
+            if event["event"] == "summary":
+                summary = event["summary"]
+            else:
+                yield event
+
+        yield {"event": "result", "result": self.finalize(pub, pub_id, fetched["source"], text, summary, text_key)}
+
+    def process_publication(self, pub, pub_id):
+        for event in self.process_publication_stream(pub, pub_id):
+            if event["event"] == "result":
+                return event["result"]
@@ -0,0 +1,282 @@
+"""
+"Related publications" from MinHash signatures in banded LSH buckets.
+
+Each publication is a set of shingles: the analyzed words of its title
+(without the generic ones in GRAPH_STOP_WORDS), plus the most frequent words
+of its cached body text. Titles are short, so single words give usable
+Jaccard similarities where word pairs would leave almost every pair near 0.
+
+A MinHash signature of `num_perm` 32-bit values estimates the Jaccard
+similarity of two sets as the fraction of equal positions. The signature is cut into `bands` bands of `rows`
+values, and publications whose band values are all equal share a bucket.
+Only publications sharing at least one bucket are compared, so a lookup
+costs the size of its buckets, not the size of the catalog. Pairs with
+Jaccard similarity s become candidates with probability 1 - (1 - s^rows)^bands.
+
+MinHash signatures merge with an elementwise minimum, so adding body text
+to a publication, or new publications to the catalog, only touches those
+rows. Persisted in the current snapshot directory under <index_dir>
+(services.snapshot): signatures.npy (n_docs, num_perm) uint32 plus
+meta.json; buckets are rebuilt from the signatures on load. Only an index
+that is not read_only writes snapshots.
+"""
+
+import hashlib
+import json
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from services.knowledge_graph import ANALYSIS_PREFIX, GRAPH_STOP_WORDS
+from services.search_index import analyze
+from services.snapshot import current_snapshot, write_snapshot
+
+FORMAT_VERSION = 1
+EMPTY = np.uint32(0xFFFFFFFF)
+
+
+def words(text):
+    return [w for w in analyze(text or "") if w not in GRAPH_STOP_WORDS and not w.isdigit()]
+
+
+class RelatedIndex:
+    def __init__(self, index_dir="data/cache/related", num_perm=256, bands=128, body_shingles=64,
+                 min_similarity=0.05, save_every=25, seed=1, read_only=False):
+        """
+        - num_perm: signature length; must be divisible by bands
+        - bands: more bands (fewer rows each) find less similar pairs, at the cost of bigger buckets
+        - body_shingles: shingles kept from each cached body, the most frequent ones
+        - save_every: incremental updates between snapshots
+        - read_only: never write snapshots (every process but one, when several share index_dir)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.index_dir = Path(index_dir)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.body_shingles = body_shingles
+        self.min_similarity = min_similarity
+        self.save_every = save_every
+        self.seed = seed
+        self.read_only = read_only
+
+        # Multiply-shift hashing: ((a * x + b) mod 2^64) >> 32, a odd
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.RLock()
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self.buckets = {}  # (band, band hash) -> [publication positions]
+        self.applied = set()
+        self.titles_fingerprint = None
+        self._n_titles = 0
+        self._dirty = 0
+
+    def __len__(self):
+        return len(self.signatures)
+
+    # -------------------------------
+    # Signatures
+    # -------------------------------
+    def shingles(self, title, body=None):
+        found = set(words(title))
+        if body:
+            found.update(term for term, _ in Counter(words(body)).most_common(self.body_shingles))
+        return found
+
+    def signature(self, shingles):
+        """MinHash of a shingle set; the empty set gets all-0xFFFFFFFF (and never matches)"""
+        if not shingles:
+            return np.full(self.num_perm, EMPTY, dtype=np.uint32)
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        hashes = (x[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        if (signature == EMPTY).all():
+            return []
+        bands = signature.reshape(self.bands, self.rows)
+        return [(band, hashlib.blake2b(bands[band].tobytes(), digest_size=8).digest()) for band in range(self.bands)]
+
+    def _index(self, pos):
+        for key in self._band_keys(self.signatures[pos]):
+            self.buckets.setdefault(key, []).append(pos)
+
+    def _unindex(self, pos):
+        for key in self._band_keys(self.signatures[pos]):
+            bucket = self.buckets.get(key)
+            if bucket and pos in bucket:
+                bucket.remove(pos)
+                if not bucket:
+                    del self.buckets[key]
+
+    # -------------------------------
+    # Build / persist
+    # -------------------------------
+    @staticmethod
+    def _fingerprint(titles):
+        digest = hashlib.sha256(str(FORMAT_VERSION).encode("utf-8"))
+        for title in titles:
+            digest.update(title.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _params(self):
+        return {"num_perm": self.num_perm, "bands": self.bands, "body_shingles": self.body_shingles,
+                "seed": self.seed}
+
+    def build(self, titles, bodies=None):
+        """Signatures for every title (plus body, when given) from scratch; persists the snapshot"""
+        titles = list(titles)
+        bodies = bodies or {}
+        with self._lock:
+            self.signatures = np.stack([self.signature(self.shingles(title, bodies.get(pos)))
+                                        for pos, title in enumerate(titles)]) if titles \
+                else np.zeros((0, self.num_perm), dtype=np.uint32)
+            self.buckets = {}
+            for pos in range(len(titles)):
+                self._index(pos)
+            self.applied = set(bodies) & set(range(len(titles)))
+            self._n_titles = len(titles)
+            self.titles_fingerprint = self._fingerprint(titles)
+            self.save()
+        return self
+
+    def save(self):
+        """Write a new snapshot and switch to it atomically (no-op when read_only)"""
+        with self._lock:
+            self._dirty = 0
+            if self.read_only:
+                return
+            signatures = self.signatures.copy()
+            meta = {"version": FORMAT_VERSION, "params": self._params(), "titles": self._n_titles,
+                    "titles_fingerprint": self.titles_fingerprint, "applied": sorted(self.applied)}
+
+            def write(path):
+                np.save(path / "signatures.npy", signatures)
+                with open(path / "meta.json", "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+
+            write_snapshot(self.index_dir, write)
+
+    def flush(self):
+        """Persist pending incremental updates, if any"""
+        with self._lock:
+            if self._dirty:
+                self.save()
+
+    def load(self):
+        """Load persisted signatures and rebuild the buckets; False when there is no usable snapshot"""
+        path = current_snapshot(self.index_dir)
+        if path is None:
+            return False
+        try:
+            with open(path / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != FORMAT_VERSION or meta.get("params") != self._params():
+                return False
+            signatures = np.load(path / "signatures.npy")
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.signatures = signatures
+            self.buckets = {}
+            for pos in range(len(signatures)):
+                self._index(pos)
+            self.applied = set(meta.get("applied", []))
+            self._n_titles = meta.get("titles", len(signatures))
+            self.titles_fingerprint = meta.get("titles_fingerprint")
+        return True
+
+    def load_or_build(self, titles, bodies=None):
+        """
+        Reuse the snapshot when its titles are a prefix of `titles`: new
+        publications and bodies it has not seen are added incrementally.
+        Anything else (an edited or reordered catalog) is a full rebuild.
+        """
+        titles = list(titles)
+        bodies = bodies or {}
+        if not (self.load() and self._n_titles <= len(titles)
+                and self.titles_fingerprint == self._fingerprint(titles[:self._n_titles])):
+            return self.build(titles, bodies)
+
+        with self._lock:
+            for pos in range(self._n_titles, len(titles)):
+                self.add(pos, titles[pos], bodies.get(pos))
+            for pos in sorted(set(bodies) - self.applied):
+                if pos < len(titles):
+                    self.add(pos, body=bodies[pos])
+            self._n_titles = len(titles)
+            self.titles_fingerprint = self._fingerprint(titles)
+            self.save()
+        return self
+
+    # -------------------------------
+    # Incremental updates
+    # -------------------------------
+    def add(self, pos, title=None, body=None):
+        """Merge the shingles of a (new or existing) publication into its signature"""
+        update = self.signature(self.shingles(title or "", body))
+        with self._lock:
+            if pos >= len(self.signatures):
+                grow = np.full((pos + 1 - len(self.signatures), self.num_perm), EMPTY, dtype=np.uint32)
+                self.signatures = np.concatenate([self.signatures, grow])
+            else:
+                self._unindex(pos)
+            self.signatures[pos] = np.minimum(self.signatures[pos], update)
+            self._index(pos)
+            if body:
+                self.applied.add(pos)
+            self._dirty += 1
+            if self._dirty >= self.save_every:
+                self.save()
+
+    def on_analysis(self, key, result):
+        """CacheStore listener for analysis:pub:<id> entries"""
+        pub_id = key[len(ANALYSIS_PREFIX):]
+        if pub_id.isdigit() and result.get("text_preview") and int(pub_id) not in self.applied:
+            self.add(int(pub_id), body=result["text_preview"])
+
+    # -------------------------------
+    # Query
+    # -------------------------------
+    def related(self, pos, limit=5):
+        """Top `limit` (position, estimated Jaccard) among publications sharing an LSH bucket with pos"""
+        with self._lock:
+            if limit < 1 or not 0 <= pos < len(self.signatures):
+                return []
+            signature = self.signatures[pos]
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self.buckets.get(key, ()))
+            candidates.discard(pos)
+            if not candidates:
+                return []
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarity = (self.signatures[candidates] == signature).mean(axis=1)
+
+        keep = similarity >= self.min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-similarity, limit - 1)[:limit]
+            candidates, similarity = candidates[top], similarity[top]
+        order = np.lexsort((candidates, -similarity))
+        return [(int(candidates[i]), round(float(similarity[i]), 4)) for i in order]
+
+    def stats(self):
+        with self._lock:
+            sizes = [len(bucket) for bucket in self.buckets.values()]
+            return {
+                "publications": len(self.signatures),
+                "bodies": len(self.applied),
+                "num_perm": self.num_perm,
+                "bands": self.bands,
+                "rows_per_band": self.rows,
+                "buckets": len(sizes),
+                "max_bucket": max(sizes, default=0),
+            }
@@ -0,0 +1,225 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+from math import log
+
+import numpy as np
+
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being'
+})
+
+
+def analyze(text, stop_words=STOP_WORDS):
+    """Lowercase, strip punctuation and drop stop words / terms of 2 chars or less"""
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return [word for word in text.split()
+            if word not in stop_words and len(word) > 2]
+
+
+def top_k(scores, k):
+    """
+    Pick the k best (doc_id, score) pairs from a {doc_id: score} dict with a heap.
+    Ties are broken by doc id so results are stable across pages.
+    """
+    if k <= 0:
+        return []
+    return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class InvertedIndex:
+    def __init__(self, analyzer, k1=1.5, b=0.75, max_expansions=20):
+        """
+        In-memory inverted index scored with BM25.
+        - postings: term -> list of (doc_id, term frequency)
+        - doc_lengths: number of indexed tokens per document
+        - analyzer: callable turning raw text into a list of terms
+        """
+        self.analyzer = analyzer
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+
+        self.postings = {}
+        self.doc_lengths = []
+        self.avg_doc_length = 0.0
+        self.vocabulary = []
+        self._arrays = None  # flat numpy postings for score_matrix(), built on first use
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def build(self, texts):
+        """Build the index from an iterable of texts; doc ids are positions"""
+        postings = {}
+        doc_lengths = []
+
+        for doc_id, text in enumerate(texts):
+            terms = self.analyzer(text) if isinstance(text, str) else []
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        self.vocabulary = sorted(postings)
+        self._arrays = None
+        return self
+
+    def idf(self, term):
+        """BM25 idf (Lucene variant, always positive)"""
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_lengths)
+        return log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def expand(self, term):
+        """
+        Return (term, weight) pairs for a query term: the exact term plus
+        vocabulary terms it prefixes ("bone" -> "bones"), at half weight.
+        Keeps the recall of the old substring match without a full scan.
+        """
+        expanded = []
+        if term in self.postings:
+            expanded.append((term, 1.0))
+
+        pos = bisect_left(self.vocabulary, term)
+        while pos < len(self.vocabulary) and len(expanded) < self.max_expansions:
+            candidate = self.vocabulary[pos]
+            if not candidate.startswith(term):
+                break
+            if candidate != term:
+                expanded.append((candidate, 0.5))
+            pos += 1
+        return expanded
+
+    def weighted_terms(self, terms, expansions=None):
+        """{index term: expansion weight} for query terms; expansions memoizes expand() across queries"""
+        weighted = {}
+        for term in terms:
+            expanded = expansions.get(term) if expansions is not None else None
+            if expanded is None:
+                expanded = self.expand(term)
+                if expansions is not None:
+                    expansions[term] = expanded
+            for candidate, weight in expanded:
+                weighted[candidate] = max(weighted.get(candidate, 0.0), weight)
+        return weighted
+
+    def score(self, terms):
+        """Return {doc_id: bm25 score} for every document matching any term"""
+        scores = {}
+        if not self.doc_lengths:
+            return scores
+
+        k1, b, avgdl = self.k1, self.b, self.avg_doc_length or 1.0
+        doc_lengths = self.doc_lengths
+
+        weighted = self.weighted_terms(terms)
+
+        for term, weight in weighted.items():
+            idf = self.idf(term) * weight
+            for doc_id, tf in self.postings[term]:
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def top_k(self, terms, k):
+        """
+        Score the query and pick the k best documents with a heap.
+        Returns (ranked list of (doc_id, score), total number of matches).
+        """
+        scores = self.score(terms)
+        return top_k(scores, k), len(scores)
+
+    def arrays(self):
+        """
+        Postings flattened into numpy arrays, in vocabulary order:
+        - offsets: term id -> start of its postings (length n_terms + 1)
+        - docs: doc id of every posting
+        - weights: the BM25 tf part tf * (k1 + 1) / (tf + norm) of every posting
+        - idf: per term id
+        """
+        if self._arrays is None:
+            k1, b, avgdl = self.k1, self.b, self.avg_doc_length or 1.0
+            norms = k1 * (1 - b + b * np.asarray(self.doc_lengths, dtype=np.float64) / avgdl)
+            lists = [self.postings[term] for term in self.vocabulary]
+            offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+            np.cumsum([len(p) for p in lists], out=offsets[1:])
+            pairs = np.fromiter(chain.from_iterable(chain.from_iterable(lists)), dtype=np.int64,
+                                count=2 * int(offsets[-1])).reshape(-1, 2)
+            docs, tf = pairs[:, 0], pairs[:, 1].astype(np.float64)
+            self._arrays = {
+                "term_ids": {term: i for i, term in enumerate(self.vocabulary)},
+                "offsets": offsets,
+                "docs": docs,
+                "weights": tf * (k1 + 1) / (tf + norms[docs]),
+                "idf": np.array([self.idf(term) for term in self.vocabulary], dtype=np.float64),
+            }
+        return self._arrays
+
+    def score_many(self, term_lists, expansions=None):
+        """
+        BM25 scores of many queries at once, as parallel arrays (cells, scores)
+        of the nonzero entries of the (query, doc) score matrix, with
+        cell = query row * n_docs + doc id. The postings of every query are
+        gathered into one flat list and summed with sum_cells(), so the cost
+        follows the number of matching postings, not the catalog size.
+        Row i holds the same scores as score(term_lists[i]).
+        """
+        n_docs = len(self.doc_lengths)
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0)
+        if not n_docs or not term_lists:
+            return empty
+        arrays = self.arrays()
+        term_ids = arrays["term_ids"]
+
+        rows, terms, factors = [], [], []
+        for row, query_terms in enumerate(term_lists):
+            for term, weight in self.weighted_terms(query_terms, expansions).items():
+                rows.append(row)
+                terms.append(term_ids[term])
+                factors.append(weight)
+        if not rows:
+            return empty
+
+        terms = np.asarray(terms, dtype=np.int64)
+        starts = arrays["offsets"][terms]
+        lengths = arrays["offsets"][terms + 1] - starts
+        # Positions of every selected posting: each term's run start..start + length
+        runs = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        postings = runs + np.arange(int(lengths.sum()))
+        factors = np.asarray(factors) * arrays["idf"][terms]
+
+        cells = np.repeat(np.asarray(rows, dtype=np.int64), lengths) * n_docs + arrays["docs"][postings]
+        return sum_cells(cells, arrays["weights"][postings] * np.repeat(factors, lengths))
+
+
+def sum_cells(cells, scores):
+    """Merge duplicate cells, summing their scores; returns (sorted unique cells, sums)"""
+    cells, inverse = np.unique(cells, return_inverse=True)
+    return cells, np.bincount(inverse.ravel(), weights=scores, minlength=len(cells))
+
+
+def top_k_cells(cells, scores, n_rows, n_docs, k):
+    """
+    Per query row of a sparse score matrix (see score_many), (ranked
+    [(doc_id, score)] of at most k, number of matching documents). Same
+    order as top_k(): score descending, ties broken by doc id.
+    """
+    rows, docs = np.divmod(cells, max(n_docs, 1))
+    totals = np.bincount(rows, minlength=n_rows)
+    order = np.lexsort((docs, -scores, rows))
+    # Rank of every entry within its row; rows are contiguous after the sort
+    rank = np.arange(len(order)) - np.repeat(np.cumsum(totals) - totals, totals)
+    keep = order[rank < k]
+    results, at = [], 0
+    for total in totals.tolist():
+        n = min(total, k)
+        picked = keep[at:at + n]
+        at += n
+        results.append(([(int(d), float(v)) for d, v in zip(docs[picked], scores[picked])], total))
+    return results
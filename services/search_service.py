@@ -1,26 +1,157 @@
-import pandas as pd
-import re
 from math import ceil
+import numpy as np
+from services.search_index import InvertedIndex, STOP_WORDS, analyze, top_k, sum_cells, top_k_cells
+from services.suggest_index import SuggestIndex
+from services.lru_cache import LRUCache
+from services.metrics import STAGE_SECONDS, record_cache
+
+SEARCH_FIELDS = ('title', 'body', 'all')
+SEARCH_MODES = ('lexical', 'semantic', 'hybrid')
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked [(id, score)] lists: each id scores sum(1 / (k + rank)) over the lists it appears in"""
+    fused = {}
+    for ranking in rankings:
+        for rank, (pos, _) in enumerate(ranking, start=1):
+            fused[pos] = fused.get(pos, 0.0) + 1.0 / (k + rank)
+    return top_k(fused, len(fused))
+
 
 class SearchService:
-    def __init__(self):
-        self.stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-            'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being'
-        }
+    def __init__(self, fulltext_index=None, title_boost=2.0,
+                 cache_size=512, cache_ttl=600, cache_depth=100,
+                 semantic_index=None, rrf_k=60, batch_chunk=256):
+        self.stop_words = set(STOP_WORDS)
+        self.index = None
+        self.suggest_index = None
+        self._indexed_catalog = None
+        # Optional on-disk body index (services.fulltext_index.FullTextIndex)
+        self.fulltext_index = fulltext_index
+        self.title_boost = title_boost
+        # Optional dense index (services.semantic_index.SemanticIndex) for mode='semantic'/'hybrid'
+        self.semantic_index = semantic_index
+        self._semantic_catalog = None
+        self.rrf_k = rrf_k
+        # Queries scored together by search_batch(); bounds its working memory
+        self.batch_chunk = batch_chunk
+        
+        # Ranked id lists keyed on the normalized term set; pages are slices of these
+        self.result_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.cache_depth = cache_depth
     
     def preprocess_query(self, query):
         """Clean and preprocess search query"""
-        # Convert to lowercase and remove special characters
-        query = re.sub(r'[^\w\s]', ' ', query.lower())
-        # Split into words and remove stop words
-        words = [word.strip() for word in query.split() 
-                if word.strip() and word not in self.stop_words and len(word) > 2]
-        return words
+        # Lowercase, remove special characters and stop words (same analyzer as the indexes)
+        return analyze(query, self.stop_words)
+    
+    def build_index(self, catalog):
+        """Build the title and suggestion indexes; call whenever the catalog is (re)loaded"""
+        titles = catalog.titles if catalog is not None else []
+        self.index = InvertedIndex(self.preprocess_query).build(titles)
+        self.suggest_index = SuggestIndex(self.preprocess_query).build(titles)
+        self._indexed_catalog = catalog
+        self.result_cache.clear()  # rankings refer to row positions of the old catalog
+        return self.index
+
+    def build_semantic(self, catalog, bodies=None):
+        """
+        Load or (re)build the semantic index for catalog; bodies is an optional
+        {row position: body text} of cached analyses, appended to the titles
+        """
+        if self.semantic_index is None or catalog is None:
+            return None
+        bodies = bodies or {}
+        texts = [f"{title}\n{bodies.get(pos, '')}" for pos, title in enumerate(catalog.titles)]
+        with STAGE_SECONDS.time(stage="semantic_build"):
+            self.semantic_index.load_or_build(texts)
+        self._semantic_catalog = catalog
+        self.result_cache.clear()
+        return self.semantic_index
+
+    def score(self, terms, field='title'):
+        """Return {row position: score} for the given field ('title', 'body' or 'all')"""
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"Unknown search field: {field}")
+        
+        scores = {}
+        if field in ('title', 'all'):
+            boost = self.title_boost if field == 'all' else 1.0
+            for pos, score in self.index.score(terms).items():
+                scores[pos] = score * boost
+        if field in ('body', 'all') and self.fulltext_index is not None:
+            n_docs = len(self.index)
+            for pos, score in self.fulltext_index.score(terms).items():
+                if pos < n_docs:  # ignore bodies indexed against an older catalog
+                    scores[pos] = scores.get(pos, 0.0) + score
+        return scores
+    
+    def ranked(self, terms, field='title', depth=None):
+        """
+        Return (ranked list of (row position, score), total matches) holding at
+        least `depth` entries when that many exist. Results are cached under the
+        sorted term set, so word order and punctuation share one entry.
+        """
+        depth = max(depth or 0, self.cache_depth)
+        key = (field, tuple(sorted(set(terms))))
+        if field != 'title' and self.fulltext_index is not None:
+            key += (self.fulltext_index.version,)  # new bodies invalidate body rankings
+        
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            ranked, total = cached
+            if len(ranked) >= min(depth, total):
+                record_cache("search_results", True)
+                return cached
+        record_cache("search_results", False)
+        
+        scores = self.score(terms, field)
+        result = (top_k(scores, depth), len(scores))
+        self.result_cache.put(key, result)
+        return result
+
+    def ranked_semantic(self, query, depth=None):
+        """(ranked [(row position, cosine)], documents above the similarity floor) from the dense index"""
+        depth = max(depth or 0, self.cache_depth)
+        key = ('semantic', tuple(analyze(query, self.stop_words)), self.semantic_index.fingerprint)
+        cached = self.result_cache.get(key)
+        if cached is not None and len(cached[0]) >= min(depth, cached[1]):
+            record_cache("search_results", True)
+            return cached
+        record_cache("search_results", False)
+        
+        result = self.semantic_index.search(query, depth)
+        self.result_cache.put(key, result)
+        return result
+
+    def ranked_mode(self, query, terms, field='title', mode='lexical', depth=None):
+        """
+        Ranking for a search mode: 'lexical' is BM25 over field, 'semantic'
+        the dense index (titles plus cached bodies, field is ignored) and
+        'hybrid' the reciprocal rank fusion of both. The hybrid total is the
+        larger of the two match counts, so deep pages may come up short.
+        """
+        if mode == 'lexical':
+            return self.ranked(terms, field, depth)
+        if mode == 'semantic':
+            return self.ranked_semantic(query, depth)
+        lexical, lexical_total = self.ranked(terms, field, depth)
+        semantic, semantic_total = self.ranked_semantic(query, depth)
+        fused = reciprocal_rank_fusion([lexical, semantic], self.rrf_k)
+        return fused, max(lexical_total, semantic_total, len(fused))
     
-    def search(self, df, query, page=1, per_page=10):
-        """Search publications based on query"""
-        if df is None or df.empty:
+    def cache_stats(self):
+        return self.result_cache.stats()
+    
+    @STAGE_SECONDS.timed(stage="search")
+    def search(self, catalog, query, page=1, per_page=10, field='title', mode='lexical'):
+        """
+        Search publications based on query; field is 'title', 'body' or 'all',
+        mode is 'lexical', 'semantic' or 'hybrid'
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if catalog is None or catalog.empty:
             return {"publications": [], "total": 0, "total_pages": 0}
         
         # Preprocess query
@@ -29,76 +160,122 @@ class SearchService:
         if not search_terms:
             return {"publications": [], "total": 0, "total_pages": 0}
         
-        # Create search pattern
-        pattern = '|'.join(search_terms)
-        
-        # Search in title (case insensitive)
-        mask = df['Title'].str.contains(pattern, case=False, na=False, regex=True)
-        
-        # Filter results
-        filtered_df = df[mask].copy()
-        
-        # Add relevance score (simple word count matching)
-        filtered_df['relevance'] = filtered_df['Title'].apply(
-            lambda x: self.calculate_relevance(x, search_terms)
-        )
+        # Index is normally built by load_data(); build lazily for other catalogs
+        if self.index is None or self._indexed_catalog is not catalog:
+            self.build_index(catalog)
+        if mode != 'lexical':
+            if self.semantic_index is None:
+                mode = 'lexical'
+            elif self._semantic_catalog is not catalog:
+                self.build_semantic(catalog)
         
-        # Sort by relevance
-        filtered_df = filtered_df.sort_values('relevance', ascending=False)
-        
-        # Calculate pagination
-        total = len(filtered_df)
+        # BM25 and/or the dense index; the page is a slice of the cached ranking
+        end_idx = page * per_page
+        start_idx = end_idx - per_page
+        ranked, total = self.ranked_mode(query, search_terms, field, mode, depth=end_idx)
         total_pages = ceil(total / per_page)
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        
-        # Get page results
-        page_results = filtered_df.iloc[start_idx:end_idx]
         
         # Convert to list of dictionaries with index
         publications = []
-        for idx, row in page_results.iterrows():
-            pub_dict = row.to_dict()
-            pub_dict['index'] = idx  # Original dataframe index for ID
+        for pos, score in ranked[start_idx:end_idx]:
+            pub_dict = catalog.record(pos)
+            pub_dict['index'] = pos  # catalog row, used as the publication id
+            pub_dict['relevance'] = score
             publications.append(pub_dict)
         
         return {
             "publications": publications,
             "total": total,
             "total_pages": total_pages,
-            "current_page": page
+            "current_page": page,
+            "mode": mode
         }
     
-    def calculate_relevance(self, title, search_terms):
-        """Calculate relevance score based on term frequency"""
-        title_lower = title.lower()
-        score = 0
-        
-        for term in search_terms:
-            # Count occurrences of each search term
-            count = title_lower.count(term.lower())
-            # Weight longer terms higher
-            weight = len(term) / 3
-            score += count * weight
-        
-        return score
-    
-    def get_suggestions(self, df, partial_query, limit=5):
-        """Get search suggestions based on partial query"""
-        if df is None or df.empty or not partial_query:
+    def ranked_batch(self, queries, term_lists, k, field='title', mode='lexical', expansions=None):
+        """
+        ranked_mode() for a chunk of queries in one pass: BM25 scores come
+        from one sweep over the postings, semantic ones from one matrix
+        product. Hybrid fuses rankings as deep as ranked_mode() does, so it
+        matches /api/search.
+        """
+        depth = max(k, self.cache_depth) if mode == 'hybrid' else k
+        lexical = semantic = None
+        if mode != 'semantic':
+            n_rows, n_docs = len(term_lists), len(self.index)
+            if field == 'body':
+                cells, scores = np.zeros(0, dtype=np.int64), np.zeros(0)
+            else:
+                cells, scores = self.index.score_many(term_lists, expansions)
+                if field == 'all':
+                    scores *= self.title_boost
+            if field != 'title' and self.fulltext_index is not None:
+                body_cells, body_scores = [cells], [scores]
+                for row, terms in enumerate(term_lists):
+                    hits = {pos: score for pos, score in self.fulltext_index.score(terms).items() if pos < n_docs}
+                    body_cells.append(np.fromiter(hits, dtype=np.int64, count=len(hits)) + row * n_docs)
+                    body_scores.append(np.fromiter(hits.values(), dtype=np.float64, count=len(hits)))
+                cells, scores = sum_cells(np.concatenate(body_cells), np.concatenate(body_scores))
+            lexical = top_k_cells(cells, scores, n_rows, n_docs, depth)
+        if mode != 'lexical':
+            semantic = self.semantic_index.search_many(queries, depth)
+        if mode == 'lexical':
+            return lexical
+        if mode == 'semantic':
+            return semantic
+        results = []
+        for (lex, lex_total), (sem, sem_total) in zip(lexical, semantic):
+            fused = reciprocal_rank_fusion([lex, sem], self.rrf_k)
+            results.append((fused[:k], max(lex_total, sem_total, len(fused))))
+        return results
+
+    def search_batch(self, catalog, queries, k=5, field='title', mode='lexical'):
+        """
+        Yield {"query", "total", "publications"} (the top k) for every query,
+        in order. Queries are analyzed once, duplicates (after analysis) are
+        scored once, and scoring runs in chunks of batch_chunk queries, so
+        memory is bounded however long the batch is.
+        """
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"Unknown search field: {field}")
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if catalog is None or catalog.empty:
+            for query in queries:
+                yield {"query": query, "total": 0, "publications": []}
+            return
+
+        if self.index is None or self._indexed_catalog is not catalog:
+            self.build_index(catalog)
+        if mode != 'lexical':
+            if self.semantic_index is None:
+                mode = 'lexical'
+            elif self._semantic_catalog is not catalog:
+                self.build_semantic(catalog)
+
+        expansions = {}  # prefix expansions, shared by every query of the batch
+        for start in range(0, len(queries), self.batch_chunk):
+            batch = queries[start:start + self.batch_chunk]
+            term_lists = [tuple(self.preprocess_query(query)) for query in batch]
+            unique = list(dict.fromkeys(terms for terms in term_lists if terms))
+            with STAGE_SECONDS.time(stage="search_batch"):
+                ranked = dict(zip(unique, self.ranked_batch(
+                    [" ".join(terms) for terms in unique], unique, k, field, mode, expansions)))
+            for query, terms in zip(batch, term_lists):
+                hits, total = ranked.get(terms, ([], 0))
+                publications = []
+                for pos, score in hits:
+                    pub_dict = catalog.record(pos)
+                    pub_dict['index'] = pos
+                    pub_dict['relevance'] = score
+                    publications.append(pub_dict)
+                yield {"query": query, "total": total, "publications": publications}
+
+    def get_suggestions(self, catalog, partial_query, limit=5):
+        """Get search suggestions (title words and bigrams) for a partial query"""
+        if catalog is None or catalog.empty or not partial_query:
             return []
         
-        # Extract unique words from titles
-        all_titles = ' '.join(df['Title'].dropna().values)
-        words = re.findall(r'\w+', all_titles.lower())
-        
-        # Find words that start with the partial query
-        suggestions = [word for word in set(words) 
-                      if word.startswith(partial_query.lower()) 
-                      and len(word) > len(partial_query)]
-        
-        # Sort by frequency and return top suggestions
-        word_counts = {word: words.count(word) for word in suggestions}
-        sorted_suggestions = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)
+        if self.suggest_index is None or self._indexed_catalog is not catalog:
+            self.build_index(catalog)
         
-        return [word for word, count in sorted_suggestions[:limit]]
\ No newline at end of file
+        return self.suggest_index.suggest(partial_query, limit)
@@ -0,0 +1,261 @@
+"""
+Dense retrieval over titles (and cached body text) with latent semantic analysis.
+
+Documents become sublinear TF-IDF vectors over unigrams plus adjacent word
+pairs joined into one token, so "space flight" and "spaceflight" share a
+feature. A randomized truncated SVD (numpy only) reduces them to `dim`
+float32 dimensions. Everything lives in <index_dir>:
+  embeddings.npy  (n_docs, dim) unit-length document vectors, memory-mapped
+  components.npy  (n_terms, dim) term -> latent space projection
+  idf.npy         (n_terms,) inverse document frequencies
+  meta.json       vocabulary, parameters and a fingerprint of the input texts
+
+A query is projected through the rows of `components` for its terms, then
+scored against every document with one matrix-vector product; the top k are
+picked with argpartition.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from services.search_index import analyze
+
+FORMAT_VERSION = 1
+
+
+def features(text):
+    """Analyzed unigrams plus each adjacent pair joined ('space', 'flight' -> 'spaceflight')"""
+    words = analyze(text) if isinstance(text, str) else []
+    return words + [a + b for a, b in zip(words, words[1:])]
+
+
+def _csr_dot(indptr, indices, data, dense, block_rows=512):
+    """Sparse (CSR) @ dense, a block of rows at a time to bound the temporary"""
+    n_rows = len(indptr) - 1
+    out = np.zeros((n_rows, dense.shape[1]), dtype=dense.dtype)
+    for start in range(0, n_rows, block_rows):
+        end = min(start + block_rows, n_rows)
+        lo, hi = indptr[start], indptr[end]
+        if lo == hi:
+            continue
+        product = data[lo:hi, None] * dense[indices[lo:hi]]
+        starts = indptr[start:end]
+        filled = np.diff(indptr[start:end + 1]) > 0
+        out[start:end][filled] = np.add.reduceat(product, starts[filled] - lo, axis=0)
+    return out
+
+
+def _transpose(indptr, indices, data, n_cols):
+    """CSR of the transpose (i.e. the CSC layout of the same matrix)"""
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    t_indptr = np.zeros(n_cols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n_cols), out=t_indptr[1:])
+    return t_indptr, rows[order], data[order]
+
+
+def randomized_svd(matrix, n_cols, rank, oversample=10, n_iter=4, seed=0):
+    """
+    Truncated SVD of a CSR matrix (indptr, indices, data) after Halko et al.:
+    sample the range with a Gaussian sketch, sharpen it with power iterations
+    (re-orthonormalized each step), then take the exact SVD of the small
+    projected matrix. Returns (U, S, Vt) with `rank` components.
+    """
+    indptr, indices, data = matrix
+    transposed = _transpose(indptr, indices, data, n_cols)
+    rng = np.random.default_rng(seed)
+    width = min(rank + oversample, n_cols, len(indptr) - 1)
+
+    q = _csr_dot(indptr, indices, data, rng.standard_normal((n_cols, width)).astype(data.dtype))
+    q, _ = np.linalg.qr(q)
+    for _ in range(n_iter):
+        z, _ = np.linalg.qr(_csr_dot(*transposed, q))
+        q, _ = np.linalg.qr(_csr_dot(indptr, indices, data, z))
+
+    b = _csr_dot(*transposed, q).T  # (width, n_cols) = Q^T X
+    u_small, s, vt = np.linalg.svd(b, full_matrices=False)
+    return (q @ u_small)[:, :rank], s[:rank], vt[:rank]
+
+
+class SemanticIndex:
+    def __init__(self, index_dir="data/cache/semantic", dim=128, min_df=2, max_df=0.5,
+                 max_features=100000, min_similarity=0.2, seed=0):
+        """
+        LSA embeddings of the catalog, persisted as memory-mappable .npy files.
+        - min_df / max_df: features in fewer than min_df documents, or in more
+          than max_df of them, are dropped
+        - min_similarity: cosine below which a document does not count as a match
+        """
+        self.index_dir = Path(index_dir)
+        self.dim = dim
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_features = max_features
+        self.min_similarity = min_similarity
+        self.seed = seed
+
+        self._lock = threading.Lock()
+        self.vocabulary = {}
+        self.idf = None
+        self.components = None
+        self.embeddings = None
+        self.fingerprint = None
+
+    def __len__(self):
+        return 0 if self.embeddings is None else len(self.embeddings)
+
+    @property
+    def ready(self):
+        return self.embeddings is not None and len(self.vocabulary) > 0
+
+    # -------------------------------
+    # Build / persist
+    # -------------------------------
+    def _fingerprint(self, texts):
+        digest = hashlib.sha256(json.dumps(
+            [FORMAT_VERSION, self.dim, self.min_df, self.max_df, self.max_features, self.seed]
+        ).encode("utf-8"))
+        for text in texts:
+            digest.update((text or "").encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _vectorize(self, term_lists):
+        """Sublinear TF-IDF rows, L2-normalized, as CSR arrays over self.vocabulary"""
+        indptr, indices, data = [0], [], []
+        for terms in term_lists:
+            counts = Counter(t for t in terms if t in self.vocabulary)
+            ids = np.fromiter((self.vocabulary[t] for t in counts), dtype=np.int32, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            weights = (1.0 + np.log(tf)) * self.idf[ids]
+            norm = np.linalg.norm(weights)
+            indices.append(ids)
+            data.append(weights / norm if norm else weights)
+            indptr.append(indptr[-1] + len(ids))
+        return (np.asarray(indptr, dtype=np.int64),
+                np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+                np.concatenate(data).astype(np.float32) if data else np.zeros(0, dtype=np.float32))
+
+    def build(self, texts):
+        """Fit the vocabulary and SVD on texts (one per catalog row) and persist the result"""
+        texts = list(texts)
+        term_lists = [features(text) for text in texts]
+        n_docs = len(term_lists)
+
+        df = Counter(term for terms in term_lists for term in set(terms))
+        max_count = max(self.max_df * n_docs, self.min_df)
+        kept = [term for term, count in df.items() if self.min_df <= count <= max_count]
+        kept = sorted(sorted(kept), key=lambda t: -df[t])[:self.max_features]
+        self.vocabulary = {term: i for i, term in enumerate(sorted(kept))}
+        counts = np.array([df[t] for t in sorted(kept)], dtype=np.float32)
+        self.idf = (np.log((1.0 + n_docs) / (1.0 + counts)) + 1.0).astype(np.float32)
+
+        rank = min(self.dim, max(n_docs - 1, 1), max(len(self.vocabulary) - 1, 1))
+        if n_docs and self.vocabulary:
+            matrix = self._vectorize(term_lists)
+            u, s, vt = randomized_svd(matrix, len(self.vocabulary), rank, seed=self.seed)
+            embeddings = (u * s).astype(np.float32)  # X V = U S: the same space queries are projected into
+            components = vt.T.astype(np.float32)
+        else:
+            embeddings = np.zeros((n_docs, rank), dtype=np.float32)
+            components = np.zeros((len(self.vocabulary), rank), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms > 0, norms, 1.0)
+
+        self.fingerprint = self._fingerprint(texts)
+        self._save(embeddings, components)
+        self.load()
+        return self
+
+    def _save(self, embeddings, components):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex
+        for name, array in (("embeddings", embeddings), ("components", components), ("idf", self.idf)):
+            tmp = self.index_dir / f".{name}.{token}.npy"
+            np.save(tmp, array)
+            os.replace(tmp, self.index_dir / f"{name}.npy")
+        meta = {
+            "version": FORMAT_VERSION, "fingerprint": self.fingerprint, "dim": int(embeddings.shape[1]),
+            "documents": int(embeddings.shape[0]), "vocabulary": sorted(self.vocabulary, key=self.vocabulary.get),
+        }
+        tmp = self.index_dir / f".meta.{token}.json"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.index_dir / "meta.json")  # written last: the commit marker
+
+    def load(self):
+        """Memory-map a persisted index; returns False when there is none (or it is unreadable)"""
+        try:
+            with open(self.index_dir / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != FORMAT_VERSION:
+                return False
+            embeddings = np.load(self.index_dir / "embeddings.npy", mmap_mode="r")
+            components = np.load(self.index_dir / "components.npy", mmap_mode="r")
+            idf = np.load(self.index_dir / "idf.npy")
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.vocabulary = {term: i for i, term in enumerate(meta["vocabulary"])}
+            self.idf, self.components, self.embeddings = idf, components, embeddings
+            self.fingerprint = meta.get("fingerprint")
+        return True
+
+    def load_or_build(self, texts):
+        """Reuse the persisted index when it was built from the same texts, otherwise rebuild it"""
+        texts = list(texts)
+        if self.load() and self.fingerprint == self._fingerprint(texts):
+            return self
+        return self.build(texts)
+
+    # -------------------------------
+    # Query
+    # -------------------------------
+    def embed_queries(self, queries):
+        """(n_queries, dim) unit vectors; queries with no known terms get a zero row"""
+        vectors = np.zeros((len(queries), self.components.shape[1]), dtype=np.float32)
+        indptr, indices, data = self._vectorize(features(q) for q in queries)
+        for row in range(len(queries)):
+            lo, hi = indptr[row], indptr[row + 1]
+            if lo < hi:
+                vectors[row] = data[lo:hi] @ self.components[indices[lo:hi]]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    def search_many(self, queries, k):
+        """
+        Per query, (ranked [(row position, cosine)] of at most k, number of
+        documents above min_similarity). All queries share one matrix product.
+        """
+        if not self.ready or not queries:
+            return [([], 0) for _ in queries]
+        scores = self.embed_queries(queries) @ np.asarray(self.embeddings).T  # (n_queries, n_docs)
+        results = []
+        for row in scores:
+            total = int(np.count_nonzero(row >= self.min_similarity))
+            n = min(k, total)
+            if n <= 0:
+                results.append(([], total))
+                continue
+            top = np.argpartition(-row, n - 1)[:n]
+            top = top[np.lexsort((top, -row[top]))]  # score desc, then row position (stable pages)
+            results.append(([(int(pos), float(row[pos])) for pos in top], total))
+        return results
+
+    def search(self, query, k):
+        return self.search_many([query], k)[0]
+
+    def stats(self):
+        return {
+            "documents": len(self),
+            "vocabulary": len(self.vocabulary),
+            "dim": 0 if self.components is None else int(self.components.shape[1]),
+            "min_similarity": self.min_similarity,
+        }
@@ -0,0 +1,57 @@
+"""
+Versioned on-disk snapshots for indexes made of several files.
+
+Each snapshot is written to its own directory <root>/v-<time>-<token>/ and
+becomes current when <root>/CURRENT (the directory name) is replaced, which
+is atomic. A reader therefore sees all files of one snapshot or all files of
+the next, never a mix, even when several processes write. Writers hold an
+exclusive lock on <root>/.lock, so snapshots are published one at a time.
+The current and the previous snapshot are kept (a reader may have resolved
+CURRENT just before the switch); older ones are removed.
+"""
+
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+
+def current_snapshot(root):
+    """Directory of the current snapshot under root, or None"""
+    root = Path(root)
+    try:
+        name = (root / "CURRENT").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    path = root / name
+    return path if name and path.is_dir() else None
+
+
+def write_snapshot(root, write):
+    """Call write(directory) on a fresh snapshot directory, then make it current; returns it"""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "a+") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            previous = current_snapshot(root)
+            path = root / f"v-{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+            path.mkdir()
+            write(path)
+            tmp = root / f".CURRENT.{uuid.uuid4().hex}"
+            tmp.write_text(path.name, encoding="utf-8")
+            os.replace(tmp, root / "CURRENT")
+            for old in root.glob("v-*"):
+                if old not in (path, previous):
+                    shutil.rmtree(old, ignore_errors=True)
+            return path
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,76 @@
+from bisect import bisect_left
+from collections import Counter
+
+
+class SuggestIndex:
+    def __init__(self, analyzer, limit=10, precomputed_prefix_len=3):
+        """
+        Frequency-weighted autocomplete over title words and bigrams.
+        - keys: sorted array of terms, searched with bisect
+        - counts: corpus frequency aligned with keys
+        - top: precomputed best completions for every short prefix, so the
+          broad 1-3 character prefixes (the largest key ranges) are a dict lookup
+        """
+        self.analyzer = analyzer
+        self.limit = limit
+        self.precomputed_prefix_len = precomputed_prefix_len
+
+        self.keys = []
+        self.counts = []
+        self.top = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def build(self, texts):
+        """Build from an iterable of titles"""
+        counter = Counter()
+        for text in texts:
+            if not isinstance(text, str):
+                continue
+            words = self.analyzer(text)
+            counter.update(words)
+            counter.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+
+        self.keys = sorted(counter)
+        self.counts = [counter[key] for key in self.keys]
+
+        # Best completions per short prefix, ranked by frequency then alphabetically
+        ranked = sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+        top = {}
+        for key, _ in ranked:
+            for n in range(1, min(len(key), self.precomputed_prefix_len) + 1):
+                bucket = top.setdefault(key[:n], [])
+                if len(bucket) <= self.limit:  # one spare in case the prefix itself is a key
+                    bucket.append(key)
+        self.top = top
+        return self
+
+    def suggest(self, prefix, limit=5):
+        """
+        Return up to `limit` completions of `prefix`, most frequent first.
+        Longer queries complete their last one or two words and keep the rest.
+        """
+        words = prefix.lower().split()
+        if not words or not self.keys:
+            return []
+
+        limit = min(limit, self.limit)
+        for tail in (2, 1):
+            if len(words) < tail:
+                continue
+            head = " ".join(words[:-tail])
+            completions = self._complete(" ".join(words[-tail:]), limit)
+            if completions:
+                return [f"{head} {c}" if head else c for c in completions]
+        return []
+
+    def _complete(self, prefix, limit):
+        if len(prefix) <= self.precomputed_prefix_len:
+            return [key for key in self.top.get(prefix, []) if key != prefix][:limit]
+
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        candidates = [(self.counts[i], self.keys[i]) for i in range(lo, hi) if self.keys[i] != prefix]
+        candidates.sort(key=lambda item: (-item[0], item[1]))
+        return [key for _, key in candidates[:limit]]
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import uuid
+import zlib
+from pathlib import Path
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TextStore:
+    def __init__(self, store_dir="data/cache/text", level=6):
+        """
+        Content-addressed store of extracted text, one artifact per source hash:
+        - <key>.pages: every page zlib-compressed on its own, concatenated
+        - <key>.json:  per page, the byte offset/length in the joined UTF-8 text
+                       and the offset/length of its compressed block
+        Pages are joined with "\\n", so a byte range of the full text maps to a
+        few pages and only those are decompressed. The .json is written last and
+        acts as the commit marker.
+        """
+        self.store_dir = Path(store_dir)
+        self.level = level
+
+    def paths(self, key):
+        """(.pages blob, .json index) for key"""
+        return self.store_dir / f"{key}.pages", self.store_dir / f"{key}.json"
+
+    def has(self, key):
+        return self.paths(key)[1].exists()
+
+    def put(self, key, pages):
+        """Store a list of page texts under key (idempotent)"""
+        blob_path, meta_path = self.paths(key)
+        if meta_path.exists():
+            return
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+        entries, offset, blob_offset = [], 0, 0
+        tmp_blob = blob_path.with_name(f".{blob_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_blob, "wb") as f:
+            for i, page in enumerate(pages):
+                raw = ((page or "") + ("\n" if i < len(pages) - 1 else "")).encode("utf-8")
+                block = zlib.compress(raw, self.level)
+                f.write(block)
+                entries.append({
+                    "offset": offset, "length": len(raw),
+                    "blob_offset": blob_offset, "blob_length": len(block),
+                })
+                offset += len(raw)
+                blob_offset += len(block)
+        os.replace(tmp_blob, blob_path)
+
+        meta = {"pages": entries, "total_bytes": offset}
+        tmp_meta = meta_path.with_name(f".{meta_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+
+    def meta(self, key):
+        with open(self.paths(key)[1], "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def page_count(self, key):
+        return len(self.meta(key)["pages"])
+
+    def read_pages(self, key, start=0, end=None):
+        """Decompress pages [start, end) and return their joined text"""
+        entries = self.meta(key)["pages"][start:end]
+        if not entries:
+            return ""
+        blob_path = self.paths(key)[0]
+        with open(blob_path, "rb") as f:
+            f.seek(entries[0]["blob_offset"])
+            data = f.read(entries[-1]["blob_offset"] + entries[-1]["blob_length"] - entries[0]["blob_offset"])
+        parts, pos = [], 0
+        for entry in entries:
+            parts.append(zlib.decompress(data[pos:pos + entry["blob_length"]]))
+            pos += entry["blob_length"]
+        return b"".join(parts).decode("utf-8")
+
+    def read_slice(self, key, start=0, end=None):
+        """Text for byte range [start, end) of the joined UTF-8 text"""
+        meta = self.meta(key)
+        end = meta["total_bytes"] if end is None else min(end, meta["total_bytes"])
+        if start >= end:
+            return ""
+        pages = [i for i, e in enumerate(meta["pages"]) if e["offset"] < end and e["offset"] + e["length"] > start]
+        first, last = pages[0], pages[-1]
+        raw = self.read_pages(key, first, last + 1).encode("utf-8")
+        base = meta["pages"][first]["offset"]
+        return raw[start - base:end - base].decode("utf-8", errors="ignore")
+
+    def read_text(self, key):
+        """Full text, stripped the same way extraction returns it"""
+        return self.read_pages(key).strip()
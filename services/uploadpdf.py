@@ -1,34 +1,125 @@
+import hashlib
+import os
+import uuid
 from pathlib import Path
 from services.pdf_processor import PDFProcessor
 from services.ai_analyzer import AIAnalyzer
+from config import Config
 
 class UploadPDFService:
-    def __init__(self, upload_dir="data/uploads"):
+    def __init__(self, upload_dir="data/uploads", pdf_processor=None, ai_analyzer=None):
         self.upload_dir = Path(upload_dir)
         self.upload_dir.mkdir(parents=True, exist_ok=True)
 
-        self.pdf_processor = PDFProcessor()
-        self.ai_analyzer = AIAnalyzer()
+        # Reuse the app's processor; models are shared through the registry either way
+        self.pdf_processor = pdf_processor or PDFProcessor()
+        self.ai_analyzer = ai_analyzer or AIAnalyzer()
+
+    def save_upload(self, pdf_file, chunk_size=64 * 1024):
+        """
+        Stream the upload to disk while hashing it and store it content-addressed
+        as <sha256>.pdf. Returns (path, sha256); identical uploads share one file.
+        """
+        max_bytes = int(Config.MAX_PDF_SIZE_MB * 1024 * 1024)
+        tmp_path = self.upload_dir / f".upload.{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = pdf_file.stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    if size == 0 and b"%PDF" not in chunk[:1024]:
+                        raise ValueError("Uploaded file is not a PDF")
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"PDF exceeds {Config.MAX_PDF_SIZE_MB} MB limit")
+                    digest.update(chunk)
+                    f.write(chunk)
+            if size == 0:
+                raise ValueError("Uploaded file is empty")
+
+            sha256 = digest.hexdigest()
+            save_path = self.upload_dir / f"{sha256}.pdf"
+            sha_path = save_path.with_name(save_path.name + ".sha256")
+            if save_path.exists():
+                tmp_path.unlink()
+            else:
+                os.replace(tmp_path, save_path)
+                sha_path.write_text(sha256, encoding="utf-8")
+            self.pdf_processor.cache.put_file(f"pdf:upload:{sha256}", [save_path, sha_path],
+                                              kind="pdf", tag=sha256, ttl=0)
+            return save_path, sha256
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+    def analysis_key(self, sha256):
+        return f"analysis:upload:{sha256}"
 
     def handle_upload(self, pdf_file) -> dict:
         """
         Save uploaded PDF, extract text, summarize with AI.
-        Returns dict: {summary, text_preview}.
+        Byte-identical uploads, and uploads of a PDF already downloaded for a
+        catalog entry, are answered from cache.
+        Returns dict: {summary, text_preview, sha256, pub_id, cached}.
         """
         if not pdf_file or pdf_file.filename == "":
             raise ValueError("No file uploaded")
 
-        # Save PDF
-        save_path = self.upload_dir / pdf_file.filename
-        pdf_file.save(str(save_path))
+        # Save PDF (content-addressed)
+        save_path, sha256 = self.save_upload(pdf_file)
+
+        for event in self.analyze_stream(save_path, sha256, pdf_file.filename):
+            if event["event"] == "result":
+                return event["result"]
+
+    def analyze_stream(self, save_path, sha256, filename=None):
+        """
+        Analysis of a saved upload as a generator of progress events (see
+        PDFProcessor.process_publication_stream), ending with
+        {"event": "result", "result": {..., "cached": bool}}.
+        """
+        cached = self.pdf_processor.cache.get_json(self.analysis_key(sha256))
+        if cached is not None:
+            yield {"event": "result", "result": dict(cached, cached=True)}
+            return
+
+        # Same bytes as a catalog PDF we already analyzed?
+        pub_id = self.pdf_processor.find_pub_by_sha(sha256)
+        if pub_id is not None:
+            analysis = self.pdf_processor.get_cached(pub_id)
+            if analysis is not None:
+                yield {"event": "result", "result": {
+                    "summary": analysis["summary"],
+                    "text_preview": analysis["text_preview"],
+                    "sha256": sha256,
+                    "pub_id": pub_id,
+                    "cached": True
+                }}
+                return
 
-        # Extract text
+        # Extract text (reuses the text store when these bytes were seen before)
+        yield {"event": "stage", "stage": "extract"}
         text = self.pdf_processor.extract_text(save_path)
 
         # Summarize with AI
-        summary = self.ai_analyzer.summarize(text)
+        yield {"event": "stage", "stage": "summarize", "source": "PDF"}
+        summary = None
+        for event in self.ai_analyzer.summarize_stream(text):
+            if event["event"] == "summary":
+                summary = event["summary"]
+            else:
+                yield event
 
-        return {
+        result = {
             "summary": summary,
-            "text_preview": text[:2000]  # first 2000 characters as preview
+            "text_preview": text[:2000],  # first 2000 characters as preview
+            "sha256": sha256,
+            "pub_id": pub_id,
+            "filename": filename
         }
+        self.pdf_processor.cache.put_json(self.analysis_key(sha256), result, kind="analysis")
+        yield {"event": "result", "result": dict(result, cached=False)}
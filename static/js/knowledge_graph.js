@@ -0,0 +1,134 @@
+// NASA Bioscience Explorer - Term co-occurrence graph (served by /api/graph, drawn with D3)
+
+function renderKG(kgData, onNodeClick) {
+    const svg = d3.select("#kg-container");
+    svg.selectAll("*").remove();
+
+    const width = svg.node().clientWidth;
+    const height = svg.node().clientHeight;
+    const maxWeight = Math.max(1, ...kgData.edges.map(e => e.weight));
+
+    const simulation = d3.forceSimulation(kgData.nodes)
+        .force("link", d3.forceLink(kgData.edges).id((d, i) => i).distance(120))
+        .force("charge", d3.forceManyBody().strength(-400))
+        .force("center", d3.forceCenter(width / 2, height / 2));
+
+    const link = svg.append("g")
+        .attr("stroke", "#888")
+        .selectAll("line")
+        .data(kgData.edges)
+        .join("line")
+        .attr("stroke-width", d => 1 + 3 * d.weight / maxWeight);
+
+    link.append("title").text(d => `PMI ${d.weight}, ${d.count} publications`);
+
+    const node = svg.append("g")
+        .selectAll("circle")
+        .data(kgData.nodes)
+        .join("circle")
+        .attr("r", d => d.depth === 0 ? 24 : 18)
+        .attr("fill", d => d.depth === 0 ? "#0b3d91" : d.depth === 1 ? "#4285f4" : "#8ab4f8")
+        .style("cursor", onNodeClick ? "pointer" : null)
+        .call(drag(simulation));
+
+    node.append("title").text(d => `${d.label} (${d.df} publications)`);
+    if (onNodeClick) node.on("click", (event, d) => onNodeClick(d.label));
+
+    const label = svg.append("g")
+        .selectAll("text")
+        .data(kgData.nodes)
+        .join("text")
+        .text(d => d.label)
+        .attr("text-anchor", "middle")
+        .attr("dy", 4)
+        .attr("fill", "#fff")
+        .style("pointer-events", "none")
+        .style("font-size", "12px");
+
+    simulation.on("tick", () => {
+        link
+            .attr("x1", d => d.source.x)
+            .attr("y1", d => d.source.y)
+            .attr("x2", d => d.target.x)
+            .attr("y2", d => d.target.y);
+
+        node
+            .attr("cx", d => d.x)
+            .attr("cy", d => d.y);
+
+        label
+            .attr("x", d => d.x)
+            .attr("y", d => d.y + 4);
+    });
+
+    function drag(simulation) {
+        function dragstarted(event, d) {
+            if (!event.active) simulation.alphaTarget(0.3).restart();
+            d.fx = d.x;
+            d.fy = d.y;
+        }
+
+        function dragged(event, d) {
+            d.fx = event.x;
+            d.fy = event.y;
+        }
+
+        function dragended(event, d) {
+            if (!event.active) simulation.alphaTarget(0);
+            d.fx = null;
+            d.fy = null;
+        }
+        return d3.drag()
+            .on("start", dragstarted)
+            .on("drag", dragged)
+            .on("end", dragended);
+    }
+}
+
+class KnowledgeGraphView {
+    constructor(section) {
+        this.section = section;
+        this.status = section.querySelector('.kg-status');
+        this.depth = section.querySelector('.kg-depth');
+        this.controller = null;
+
+        section.querySelectorAll('.kg-term').forEach(button => {
+            button.addEventListener('click', () => this.load(button.getAttribute('data-term')));
+        });
+        if (this.depth) {
+            this.depth.addEventListener('change', () => this.current && this.load(this.current));
+        }
+
+        const first = section.querySelector('.kg-term');
+        if (first) this.load(first.getAttribute('data-term'));
+    }
+
+    async load(term) {
+        if (this.controller) this.controller.abort();
+        this.controller = new AbortController();
+        this.current = term;
+        this.section.querySelectorAll('.kg-term').forEach(button => {
+            button.classList.toggle('active', button.getAttribute('data-term') === term);
+        });
+
+        const params = new URLSearchParams({ term, depth: this.depth ? this.depth.value : 1, limit: 8 });
+        this.status.textContent = `Loading "${term}"...`;
+        try {
+            const res = await fetch(`/api/graph?${params}`, { signal: this.controller.signal });
+            const data = await res.json();
+            if (!res.ok) {
+                this.status.textContent = data.error || 'Graph unavailable';
+                return;
+            }
+            this.status.textContent = `${data.nodes.length} terms, ${data.edges.length} links around "${data.term}". Click a term to explore it.`;
+            renderKG(data, (label) => this.load(label));
+        } catch (err) {
+            if (err.name !== 'AbortError') this.status.textContent = 'Graph unavailable';
+        }
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const section = document.getElementById('kg-section');
+    if (section && window.d3) new KnowledgeGraphView(section);
+});
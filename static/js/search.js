@@ -6,6 +6,7 @@ class SearchManager {
         this.suggestionsContainer = document.getElementById('suggestions');
         this.searchForm = document.getElementById('searchForm');
         this.debounceTimer = null;
+        this.suggestController = null;
 
         this.initializeEventListeners();
     }
@@ -84,9 +85,18 @@ class SearchManager {
     async showSuggestions(query) {
         if (!this.suggestionsContainer) return;
 
+        // Drop responses for queries the user has already typed past
+        if (this.suggestController) {
+            this.suggestController.abort();
+        }
+        this.suggestController = new AbortController();
+
         try {
-            // For now, show some predefined suggestions based on common space biology terms
-            const suggestions = this.getStaticSuggestions(query);
+            const response = await fetch(`/api/suggest?q=${encodeURIComponent(query)}&limit=6`, {
+                signal: this.suggestController.signal
+            });
+            const data = await response.json();
+            const suggestions = data.suggestions || [];
 
             if (suggestions.length > 0) {
                 this.renderSuggestions(suggestions);
@@ -95,27 +105,12 @@ class SearchManager {
                 this.hideSuggestions();
             }
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.error('Error fetching suggestions:', error);
             this.hideSuggestions();
         }
     }
 
-    getStaticSuggestions(query) {
-        const commonTerms = [
-            'microgravity', 'space flight', 'cell biology', 'radiation',
-            'bone density', 'muscle atrophy', 'plant biology', 'protein',
-            'gene expression', 'immune system', 'metabolism', 'oxidative stress',
-            'cardiovascular', 'neural', 'development', 'growth',
-            'space station', 'astronaut', 'biomarker', 'tissue',
-            'molecular', 'cellular', 'physiological', 'biological'
-        ];
-
-        const queryLower = query.toLowerCase();
-        return commonTerms
-            .filter(term => term.includes(queryLower))
-            .slice(0, 6);
-    }
-
     renderSuggestions(suggestions) {
         const html = suggestions.map(suggestion =>
             `<button type="button" class="btn btn-outline-secondary btn-sm suggestion-item" 
@@ -0,0 +1,88 @@
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from services.http_client import HttpClient, TokenBucket
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers each request with the next (status, headers, body) queued on the server"""
+
+    def do_GET(self):
+        self.server.seen.append(dict(self.headers))
+        status, headers, body = self.server.responses.pop(0)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.responses, self.server.seen = [], []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/doc"
+        self.tmp = tempfile.TemporaryDirectory()
+        # backoff_base=0: without Retry-After a retry would not wait at all
+        self.client = HttpClient(backoff_base=0, rate_per_host=1000, burst=1000,
+                                 validators_path=Path(self.tmp.name) / "validators.json")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_retries_503_and_429_honouring_retry_after(self):
+        self.server.responses = [(503, {"Retry-After": "1"}, b""), (429, {"Retry-After": "1"}, b""),
+                                 (200, {}, b"ok")]
+        start = time.monotonic()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"ok")
+        self.assertEqual(len(self.server.seen), 3)
+        self.assertGreaterEqual(time.monotonic() - start, 1.9)
+
+    def test_client_errors_are_not_retried(self):
+        for status in (400, 404):
+            self.server.responses, self.server.seen = [(status, {}, b"no")], []
+            self.assertEqual(self.client.get(self.url).status_code, status)
+            self.assertEqual(len(self.server.seen), 1)
+
+    def test_conditional_get_reuses_validators_on_304(self):
+        cache_path = Path(self.tmp.name) / "doc.json"
+        modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+        self.server.responses = [(200, {"ETag": '"v1"', "Last-Modified": modified}, b"body"),
+                                 (304, {}, b"")]
+        response, body = self.client.get_conditional(self.url, cache_path)
+        self.assertEqual((response.status_code, body), (200, b"body"))
+
+        response, body = self.client.get_conditional(self.url, cache_path)
+        self.assertEqual((response.status_code, body), (304, b"body"))
+        self.assertNotIn("If-None-Match", self.server.seen[0])
+        self.assertEqual(self.server.seen[1]["If-None-Match"], '"v1"')
+        self.assertEqual(self.server.seen[1]["If-Modified-Since"], modified)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_spaces_acquisitions_once_the_burst_is_spent(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+        times = []
+        for _ in range(6):
+            bucket.acquire()
+            times.append(time.monotonic())
+        self.assertLess(times[1] - times[0], 0.02)  # the burst
+        for earlier, later in zip(times[2:], times[3:]):
+            self.assertGreaterEqual(later - earlier, 0.045)  # then 1 / rate apart
+
+
+if __name__ == "__main__":
+    unittest.main()